@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Sieciowy serwer strumieniowy dla Global FM Radio.
+
+Rozsyła zdemodulowane audio (PCM s16le lub Opus) oraz opcjonalnie
+zdecymowane próbki IQ do wielu klientów TCP z jednego przechwytywania.
+Każdy klient ma własną, ograniczoną kolejkę ramek - wolny klient gubi
+najstarsze ramki zamiast blokować pętlę process_sdr.
+
+Format ramki (little-endian, nagłówek 20 bajtów):
+    magic   4s  b"GFMR"
+    kind    B   0 = audio, 1 = IQ
+    codec   B   0 = PCM s16le, 1 = Opus, 2 = complex64 (IQ)
+    chans   H   liczba kanałów
+    rate    I   częstotliwość próbkowania
+    seq     I   numer kolejny ramki w danym strumieniu
+    length  I   długość danych w bajtach
+Po połączeniu klient może wysłać jedną linię z listą strumieni,
+np. b"audio,iq\\n". Bez tej linii otrzymuje tylko audio.
+"""
+
+import asyncio
+import collections
+import struct
+import threading
+
+import numpy as np
+
+from fm_dsp import FIRDecimator, numba_kernels, resolve_backend
+
+try:
+    import opuslib
+except ImportError:
+    opuslib = None
+
+FRAME_MAGIC = b"GFMR"
+FRAME_HEADER = struct.Struct("<4sBBHIII")
+
+KIND_AUDIO = 0
+KIND_IQ = 1
+
+CODEC_PCM = 0
+CODEC_OPUS = 1
+CODEC_IQ_C64 = 2
+
+STREAM_NAMES = {"audio": KIND_AUDIO, "iq": KIND_IQ}
+
+
+def pack_frame(kind, codec, channels, rate, seq, payload):
+    """Składa nagłówek i dane w jedną ramkę."""
+    header = FRAME_HEADER.pack(FRAME_MAGIC, kind, codec, channels, int(rate), seq & 0xFFFFFFFF, len(payload))
+    return header + payload
+
+
+async def read_frame(reader):
+    """Odczytuje jedną ramkę ze strumienia. Zwraca (kind, codec, chans, rate, seq, payload)."""
+    header = await reader.readexactly(FRAME_HEADER.size)
+    magic, kind, codec, channels, rate, seq, length = FRAME_HEADER.unpack(header)
+    if magic != FRAME_MAGIC:
+        raise ValueError(f"Nieprawidłowy nagłówek ramki: {magic!r}")
+    payload = await reader.readexactly(length)
+    return kind, codec, channels, rate, seq, payload
+
+
+class ClientSlot:
+    """Kolejka ramek jednego klienta. Przepełnienie = utrata najstarszej ramki."""
+
+    def __init__(self, peer, kinds, max_frames):
+        self.peer = peer
+        self.kinds = kinds
+        self.frames = collections.deque(maxlen=max_frames)
+        self.event = asyncio.Event()
+        self.dropped = 0
+        self.sent = 0
+
+    def push(self, kind, frame):
+        if kind not in self.kinds:
+            return
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped += 1
+        self.frames.append(frame)
+        self.event.set()
+
+
+class FanOutBuffer:
+    """
+    Wspólny bufor rozsyłający ramki do wszystkich klientów.
+    publish() jest nieblokujące i bezpieczne do wywołania z wątku DSP.
+    """
+
+    def __init__(self, loop, max_frames=32):
+        self.loop = loop
+        self.max_frames = max_frames
+        self.clients = set()
+        self.lock = threading.Lock()
+
+    def add_client(self, peer, kinds):
+        slot = ClientSlot(peer, kinds, self.max_frames)
+        with self.lock:
+            self.clients.add(slot)
+        return slot
+
+    def remove_client(self, slot):
+        with self.lock:
+            self.clients.discard(slot)
+
+    def wants(self, kind):
+        """Czy jakikolwiek klient subskrybuje dany strumień (pozwala pominąć kodowanie)."""
+        with self.lock:
+            return any(kind in c.kinds for c in self.clients)
+
+    def publish(self, kind, frame):
+        # Dostęp do deque/Event wykonujemy w wątku pętli asyncio
+        try:
+            self.loop.call_soon_threadsafe(self._dispatch, kind, frame)
+        except RuntimeError:
+            pass # Pętla zamknięta - serwer zatrzymany
+
+    def _dispatch(self, kind, frame):
+        with self.lock:
+            clients = list(self.clients)
+        for slot in clients:
+            slot.push(kind, frame)
+
+
+class OpusFrameEncoder:
+    """Koduje audio float32 w ramki Opus 20 ms (wymaga opuslib)."""
+
+    def __init__(self, rate, channels=1):
+        self.rate = rate
+        self.channels = channels
+        self.frame_size = int(rate * 0.02)
+        self.encoder = opuslib.Encoder(rate, channels, opuslib.APPLICATION_AUDIO)
+        self.pending = np.zeros(0, dtype=np.int16)
+
+    def encode(self, audio):
+        """Zwraca listę zakodowanych pakietów (może być pusta)."""
+        pcm = np.clip(audio * 32767.0, -32768, 32767).astype(np.int16)
+        self.pending = np.concatenate((self.pending, pcm))
+        packets = []
+        while len(self.pending) >= self.frame_size:
+            chunk = self.pending[:self.frame_size]
+            self.pending = self.pending[self.frame_size:]
+            packets.append(self.encoder.encode(chunk.tobytes(), self.frame_size))
+        return packets
+
+
+class AudioStreamServer:
+    """
+    Serwer TCP z własną pętlą asyncio w osobnym wątku.
+    Wątek DSP wywołuje publish_audio() / publish_iq(), klienci dostają ramki.
+    """
+
+    def __init__(self, host="0.0.0.0", port=7355, audio_rate=48000, codec="pcm",
+                 iq_rate=288e3, iq_decimation=4, max_frames=32):
+        self.host = host
+        self.port = port
+        self.audio_rate = int(audio_rate)
+        self.iq_rate = iq_rate
+        self.iq_decimation = max(1, int(iq_decimation))
+        self.iq_decimator = None # FIRDecimator tworzony przy pierwszym bloku (zależy od rozmiaru bloku)
+        self.max_frames = max_frames
+
+        if codec == "opus" and opuslib is None:
+            print("Brak biblioteki opuslib - serwer użyje PCM.")
+            codec = "pcm"
+        self.codec = codec
+        self.opus = None
+
+        self.loop = None
+        self.fanout = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.audio_seq = 0
+        self.iq_seq = 0
+
+    # === STEROWANIE ===
+
+    def start(self):
+        """Uruchamia serwer w tle i czeka, aż gniazdo będzie nasłuchiwać."""
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+        self.ready.wait(timeout=5.0)
+        if self.server is None:
+            raise RuntimeError(f"Nie udało się uruchomić serwera na {self.host}:{self.port}")
+        # Port 0 = losowy wolny port (przydatne w testach pętli zwrotnej)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"Serwer strumieniowy nasłuchuje na {self.host}:{self.port} ({self.codec})")
+
+    def stop(self):
+        if self.loop is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._shutdown)
+        except RuntimeError:
+            pass
+        if self.thread:
+            self.thread.join(timeout=2.0)
+        self.thread = None
+
+    def client_count(self):
+        if self.fanout is None:
+            return 0
+        with self.fanout.lock:
+            return len(self.fanout.clients)
+
+    # === PUBLIKACJA Z WĄTKU DSP ===
+
+    def publish_audio(self, audio):
+        """Publikuje blok audio float32 (-1..1). Nie blokuje."""
+        if self.fanout is None or not self.fanout.wants(KIND_AUDIO):
+            return
+        try:
+            if self.codec == "opus":
+                if self.opus is None:
+                    self.opus = OpusFrameEncoder(self.audio_rate)
+                for packet in self.opus.encode(audio):
+                    self._publish(KIND_AUDIO, CODEC_OPUS, self.audio_rate, packet)
+            else:
+                pcm = np.clip(audio * 32767.0, -32768, 32767).astype("<i2")
+                self._publish(KIND_AUDIO, CODEC_PCM, self.audio_rate, pcm.tobytes())
+        except Exception as e:
+            print(f"Błąd publikacji audio: {e}")
+
+    def publish_iq(self, samples):
+        """Publikuje zdecymowane próbki IQ jako complex64. Nie blokuje."""
+        if self.fanout is None or not self.fanout.wants(KIND_IQ):
+            return
+        try:
+            iq = samples
+            if self.iq_decimation > 1:
+                # Filtr FIR z historią, by nie aliasować sąsiednich kanałów ani nie trzaskać na granicach bloków
+                if self.iq_decimator is None or self.iq_decimator.block_size != len(samples):
+                    kernels = numba_kernels() if resolve_backend() == "numba" else None
+                    self.iq_decimator = FIRDecimator(
+                        self.iq_decimation, len(samples), dtype=np.complex64, kernels=kernels
+                    )
+                iq = self.iq_decimator.process(samples)
+            payload = np.asarray(iq, dtype="<c8").tobytes()
+            self._publish(KIND_IQ, CODEC_IQ_C64, self.iq_rate / self.iq_decimation, payload)
+        except Exception as e:
+            print(f"Błąd publikacji IQ: {e}")
+
+    def reset(self):
+        """Czyści historię decymatora IQ (po zmianie częstotliwości, z wątku DSP)."""
+        if self.iq_decimator:
+            self.iq_decimator.reset()
+
+    def _publish(self, kind, codec, rate, payload):
+        if kind == KIND_AUDIO:
+            seq = self.audio_seq
+            self.audio_seq += 1
+        else:
+            seq = self.iq_seq
+            self.iq_seq += 1
+        self.fanout.publish(kind, pack_frame(kind, codec, 1, rate, seq, payload))
+
+    # === PĘTLA ASYNCIO ===
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.fanout = FanOutBuffer(self.loop, self.max_frames)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port)
+            )
+        except OSError as e:
+            print(f"Błąd uruchamiania serwera strumieniowego: {e}")
+            self.ready.set()
+            self.loop.close()
+            return
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+    def _shutdown(self):
+        if self.server:
+            self.server.close()
+        for task in asyncio.all_tasks(self.loop):
+            task.cancel()
+        self.loop.call_soon(self.loop.stop)
+
+    async def _read_subscription(self, reader):
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout=1.0)
+        except asyncio.TimeoutError:
+            return {KIND_AUDIO}
+        names = [n.strip().lower() for n in line.decode("ascii", "ignore").split(",")]
+        kinds = {STREAM_NAMES[n] for n in names if n in STREAM_NAMES}
+        return kinds or {KIND_AUDIO}
+
+    async def _handle_client(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        kinds = await self._read_subscription(reader)
+        slot = self.fanout.add_client(peer, kinds)
+        print(f"Klient połączony: {peer}")
+        try:
+            while True:
+                await slot.event.wait()
+                slot.event.clear()
+                while slot.frames:
+                    writer.write(slot.frames.popleft())
+                    slot.sent += 1
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.fanout.remove_client(slot)
+            writer.close()
+            print(f"Klient rozłączony: {peer} (wysłano {slot.sent}, utracono {slot.dropped})")
+
+
+# === PROSTY KLIENT (PĘTLA ZWROTNA / DIAGNOSTYKA) ===
+
+async def receive_frames(host, port, streams="audio", max_frames=None, timeout=5.0):
+    """Łączy się z serwerem i zwraca listę odebranych ramek."""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"{streams}\n".encode("ascii"))
+    await writer.drain()
+    frames = []
+    try:
+        while max_frames is None or len(frames) < max_frames:
+            frames.append(await asyncio.wait_for(read_frame(reader), timeout=timeout))
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+    return frames
+
+
+def decode_pcm(payload):
+    """Zamienia dane PCM s16le na float32."""
+    return np.frombuffer(payload, dtype="<i2").astype(np.float32) / 32767.0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Klient diagnostyczny serwera Global FM Radio")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7355)
+    parser.add_argument("--streams", default="audio", help="np. audio lub audio,iq")
+    parser.add_argument("--frames", type=int, default=100)
+    args = parser.parse_args()
+
+    received = asyncio.run(receive_frames(args.host, args.port, args.streams, args.frames))
+    lost = 0
+    last_seq = {}
+    for kind, codec, channels, rate, seq, payload in received:
+        if kind in last_seq and seq != last_seq[kind] + 1:
+            lost += seq - last_seq[kind] - 1
+        last_seq[kind] = seq
+    print(f"Odebrano {len(received)} ramek, utraconych po stronie serwera: {lost}")
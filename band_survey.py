@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Ankieta zajętości pasma (band survey) dla RTL-SDR.
+
+Tuner wielokrotnie przemiata pasmo, a dla każdego binu częstotliwości
+zbierane są statystyki w stałych, prealokowanych tablicach NumPy:
+min, max, średnia, histogram poziomów (z niego percentyle) oraz
+współczynnik zajętości (duty cycle) powyżej progu. Pamięć nie rośnie
+z czasem pomiaru - także "wodospad" jest pierścieniem o stałej liczbie wierszy.
+
+Wyniki: CSV (tabela statystyk), NPZ (wszystkie tablice) oraz mapy
+cieplne PNG (histogram poziom/częstotliwość i wodospad). PNG zapisywane są
+bez dodatkowych bibliotek.
+
+Użycie (radio.py nie może w tym czasie korzystać z tunera):
+    python3 band_survey.py --hours 6 --out ankieta_fm
+    python3 band_survey.py --rtl-tcp 192.168.1.20:1234 --start 87.5 --stop 108
+"""
+
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from fm_dsp import IQ_LUT, average_psd, psd_dbm
+
+
+class BandSurvey:
+    """Statystyki widma dla całego pasma o stałym rozmiarze pamięci."""
+
+    def __init__(self, f_min=87.5e6, f_max=108e6, sample_rate=2.048e6, fft_size=256,
+                 usable=0.75, level_min=-120.0, level_max=0.0, level_step=1.0,
+                 threshold_dbm=-60.0, waterfall_rows=720, waterfall_cols=1024):
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.bin_width = sample_rate / fft_size
+        self.threshold_dbm = threshold_dbm
+
+        # Z każdego ujęcia bierzemy tylko środkową część widma (brzegi tłumi filtr tunera)
+        self.bins_per_step = int(fft_size * usable) // 2 * 2
+        self.step = self.bins_per_step * self.bin_width
+        self.num_steps = int(np.ceil((f_max - f_min) / self.step))
+        self.num_bins = self.num_steps * self.bins_per_step
+        self.f_min = f_min
+        self.f_max = f_min + self.num_bins * self.bin_width
+        self.freqs = f_min + (np.arange(self.num_bins) + 0.5) * self.bin_width
+
+        first = (fft_size - self.bins_per_step) // 2
+        self.keep = slice(first, first + self.bins_per_step)
+        self.dc_bin = fft_size // 2 - first
+
+        self.window = np.hanning(fft_size).astype(np.float32)
+
+        # Statystyki per bin
+        self.count = np.zeros(self.num_bins, dtype=np.uint32)
+        self.min = np.full(self.num_bins, np.inf, dtype=np.float32)
+        self.max = np.full(self.num_bins, -np.inf, dtype=np.float32)
+        self.sum = np.zeros(self.num_bins, dtype=np.float64)
+        self.active = np.zeros(self.num_bins, dtype=np.uint32)
+
+        self.level_min = level_min
+        self.level_step = level_step
+        self.num_levels = int(round((level_max - level_min) / level_step))
+        self.hist = np.zeros((self.num_bins, self.num_levels), dtype=np.uint32)
+
+        # Wodospad: pierścień średnich z przemiatania, kolumny zgrupowane maksimum
+        self.waterfall_cols = min(waterfall_cols, self.num_bins)
+        self.col_group = int(np.ceil(self.num_bins / self.waterfall_cols))
+        self.waterfall_cols = int(np.ceil(self.num_bins / self.col_group))
+        self.waterfall = np.full((waterfall_rows, self.waterfall_cols), level_min, dtype=np.float32)
+        self.waterfall_row = 0
+        self.sweeps = 0
+        self.sweep_row = np.full(self.waterfall_cols * self.col_group, level_min, dtype=np.float32)
+
+        # Bufory robocze jednego ujęcia
+        self.iq = np.empty(0, dtype=np.complex64)
+        self.psd = np.empty(fft_size, dtype=np.float32)
+        self.bin_index = np.arange(self.bins_per_step)
+
+        self.started = time.time()
+
+    def step_center(self, step):
+        """Częstotliwość środkowa tunera dla danego kroku przemiatania."""
+        return self.f_min + (step + 0.5) * self.step
+
+    # === POMIAR ===
+
+    def spectrum_dbm(self, iq):
+        """Uśredniona moc binów ujęcia w dBm (fm_dsp.psd_dbm), z usuniętym DC."""
+        average_psd(iq, self.window, out=self.psd)
+        psd = np.fft.fftshift(self.psd)[self.keep]
+        # Szpilka DC tunera - zastąp średnią sąsiadów
+        dc = self.dc_bin
+        psd[dc] = 0.5 * (psd[dc - 1] + psd[dc + 1])
+        return psd_dbm(psd, self.window)
+
+    def add_step(self, step, levels):
+        """Dopisuje poziomy binów jednego kroku do statystyk."""
+        sl = slice(step * self.bins_per_step, (step + 1) * self.bins_per_step)
+        levels = levels.astype(np.float32, copy=False)
+        self.count[sl] += 1
+        np.minimum(self.min[sl], levels, out=self.min[sl])
+        np.maximum(self.max[sl], levels, out=self.max[sl])
+        self.sum[sl] += levels
+        self.active[sl] += levels > self.threshold_dbm
+
+        idx = ((levels - self.level_min) / self.level_step).astype(np.int64)
+        np.clip(idx, 0, self.num_levels - 1, out=idx)
+        self.hist[self.bin_index + sl.start, idx] += 1
+
+        self.sweep_row[sl] = levels
+
+    def end_sweep(self):
+        """Zamyka przemiatanie: dopisuje wiersz wodospadu (pierścień)."""
+        row = self.sweep_row.reshape(self.waterfall_cols, self.col_group).max(axis=1)
+        self.waterfall[self.waterfall_row % len(self.waterfall)] = row
+        self.waterfall_row += 1
+        self.sweeps += 1
+
+    def read_iq(self, sdr, num_samples):
+        raw = np.frombuffer(sdr.read_bytes(2 * num_samples), dtype=np.uint8, count=2 * num_samples)
+        if len(self.iq) != num_samples:
+            self.iq = np.empty(num_samples, dtype=np.complex64)
+        np.take(IQ_LUT, raw, out=self.iq.view(np.float32))
+        return self.iq
+
+    def sweep(self, sdr, frames=32, settle_samples=4096):
+        """Jedno pełne przemiatanie pasma."""
+        for step in range(self.num_steps):
+            sdr.center_freq = self.step_center(step)
+            sdr.read_bytes(2 * settle_samples) # Odrzuć próbki z czasu przestrajania
+            iq = self.read_iq(sdr, frames * self.fft_size)
+            self.add_step(step, self.spectrum_dbm(iq))
+        self.end_sweep()
+
+    # === WYNIKI ===
+
+    def mean(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 0, self.sum / np.maximum(self.count, 1), np.nan)
+
+    def duty_cycle(self):
+        return self.active / np.maximum(self.count, 1)
+
+    def percentile(self, q):
+        """Percentyl poziomu (dBm) z histogramu, z dokładnością do level_step (NaN dla nieodwiedzonych binów)."""
+        cdf = np.cumsum(self.hist, axis=1)
+        target = np.maximum(self.count, 1)[:, None] * (q / 100.0)
+        idx = np.argmax(cdf >= target, axis=1)
+        return np.where(self.count > 0, self.level_min + (idx + 0.5) * self.level_step, np.nan)
+
+    def ordered_waterfall(self):
+        rows = min(self.waterfall_row, len(self.waterfall))
+        end = self.waterfall_row % len(self.waterfall)
+        if self.waterfall_row <= len(self.waterfall):
+            return self.waterfall[:rows]
+        return np.concatenate((self.waterfall[end:], self.waterfall[:end]))
+
+    def save_csv(self, path):
+        columns = [self.freqs / 1e6, self.min, self.max, self.mean(),
+                   self.percentile(10), self.percentile(50), self.percentile(90),
+                   self.duty_cycle() * 100]
+        np.savetxt(path, np.column_stack(columns), delimiter=",", fmt="%.4f",
+                   header="freq_mhz,min_dbm,max_dbm,mean_dbm,p10_dbm,p50_dbm,p90_dbm,duty_pct",
+                   comments="")
+
+    def save_npz(self, path):
+        np.savez_compressed(
+            path, freqs=self.freqs, count=self.count, min=self.min, max=self.max,
+            sum=self.sum, active=self.active, hist=self.hist,
+            level_min=self.level_min, level_step=self.level_step,
+            threshold_dbm=self.threshold_dbm, waterfall=self.ordered_waterfall(),
+            sweeps=self.sweeps, started=self.started, saved=time.time()
+        )
+
+    def save_heatmaps(self, prefix):
+        # Histogram: oś X = częstotliwość (zgrupowana), oś Y = poziom (góra = mocny)
+        # Ostatnia grupa kolumn może być niepełna - dopełnienie zerami (jak sweep_row)
+        hist = np.zeros((self.waterfall_cols * self.col_group, self.num_levels), dtype=self.hist.dtype)
+        hist[:self.num_bins] = self.hist
+        grouped = hist.reshape(self.waterfall_cols, self.col_group, self.num_levels).sum(axis=1)
+        density = np.log1p(grouped.T[::-1].astype(np.float32))
+        write_png(f"{prefix}_histogram.png", density)
+
+        waterfall = self.ordered_waterfall()
+        if len(waterfall):
+            write_png(f"{prefix}_waterfall.png", waterfall)
+
+    def save(self, prefix):
+        self.save_csv(f"{prefix}.csv")
+        self.save_npz(f"{prefix}.npz")
+        self.save_heatmaps(prefix)
+
+
+# === ZAPIS PNG BEZ ZALEŻNOŚCI ===
+
+def heat_colormap(values):
+    """Wartości 0..1 -> RGB uint8 (czarny -> niebieski -> zielony -> żółty -> czerwony)."""
+    stops = np.array([[0, 0, 0], [0, 0, 160], [0, 200, 80], [255, 230, 0], [255, 40, 0]], dtype=np.float32)
+    pos = np.clip(values, 0, 1) * (len(stops) - 1)
+    low = np.floor(pos).astype(np.int64)
+    high = np.minimum(low + 1, len(stops) - 1)
+    frac = (pos - low)[..., None]
+    return (stops[low] * (1 - frac) + stops[high] * frac).astype(np.uint8)
+
+
+def write_png(path, data, vmin=None, vmax=None):
+    """Zapisuje tablicę 2D jako kolorowy obraz PNG (wiersz 0 = góra obrazu)."""
+    data = np.asarray(data, dtype=np.float32)
+    finite = data[np.isfinite(data)]
+    if vmin is None:
+        vmin = float(finite.min()) if finite.size else 0.0
+    if vmax is None:
+        vmax = float(finite.max()) if finite.size else 1.0
+    scaled = (np.nan_to_num(data, nan=vmin) - vmin) / max(vmax - vmin, 1e-12)
+    rgb = heat_colormap(scaled)
+    height, width = data.shape
+
+    raw = np.zeros((height, 1 + width * 3), dtype=np.uint8) # bajt filtra 0 na początku wiersza
+    raw[:, 1:] = rgb.reshape(height, width * 3)
+
+    def chunk(kind, payload):
+        body = kind + payload
+        return struct.pack(">I", len(payload)) + body + struct.pack(">I", zlib.crc32(body) & 0xFFFFFFFF)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+def run_survey(sdr, survey, hours=1.0, prefix="survey", save_every=600.0):
+    """Przemiata pasmo przez podany czas, co save_every sekund zapisuje wyniki."""
+    end_time = time.time() + hours * 3600
+    last_save = time.time()
+    try:
+        while time.time() < end_time:
+            sweep_start = time.time()
+            survey.sweep(sdr)
+            print(f"Przemiatanie {survey.sweeps}: {time.time() - sweep_start:.1f} s")
+            if time.time() - last_save > save_every:
+                survey.save(prefix)
+                last_save = time.time()
+    except KeyboardInterrupt:
+        print("Przerwano - zapisuję wyniki...")
+    survey.save(prefix)
+    print(f"Zapisano {prefix}.csv, {prefix}.npz i mapy PNG ({survey.sweeps} przemiatań)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ankieta zajętości pasma (band survey)")
+    parser.add_argument("--start", type=float, default=87.5, help="Początek pasma [MHz]")
+    parser.add_argument("--stop", type=float, default=108.0, help="Koniec pasma [MHz]")
+    parser.add_argument("--rate", type=float, default=2.048e6, help="Częstotliwość próbkowania tunera")
+    parser.add_argument("--fft", type=int, default=256, help="Rozmiar FFT (rozdzielczość = rate/fft)")
+    parser.add_argument("--gain", default="auto", help="Wzmocnienie [dB] lub 'auto'")
+    parser.add_argument("--threshold", type=float, default=-60.0, help="Próg zajętości [dBm]")
+    parser.add_argument("--hours", type=float, default=1.0)
+    parser.add_argument("--save-every", type=float, default=600.0, help="Zapis pośredni co N sekund")
+    parser.add_argument("--out", default="survey", help="Prefiks plików wynikowych")
+    parser.add_argument("--rtl-tcp", metavar="HOST:PORT", help="Zdalny tuner rtl_tcp")
+    args = parser.parse_args()
+
+    if args.rtl_tcp:
+        from rtl_tcp_source import RtlTcpSource, parse_address
+        sdr = RtlTcpSource(*parse_address(args.rtl_tcp))
+    else:
+        from rtlsdr import RtlSdr
+        sdr = RtlSdr()
+    sdr.sample_rate = args.rate
+    sdr.gain = args.gain if args.gain == "auto" else float(args.gain)
+
+    survey = BandSurvey(args.start * 1e6, args.stop * 1e6, args.rate, args.fft,
+                        threshold_dbm=args.threshold)
+    print(f"Pasmo {survey.f_min / 1e6:.3f}-{survey.f_max / 1e6:.3f} MHz, "
+          f"{survey.num_steps} kroków, {survey.num_bins} binów po {survey.bin_width / 1e3:.1f} kHz")
+    try:
+        run_survey(sdr, survey, args.hours, args.out, args.save_every)
+    finally:
+        sdr.close()
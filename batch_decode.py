@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Wsadowe dekodowanie archiwów IQ (bez GUI i bez tunera).
+
+Każde nagranie z katalogu jest dekodowane tym samym torem DSP co w trybie
+na żywo (fm_dsp.FMDemodulator) i zapisywane jako:
+    <nazwa>.wav            - zdemodulowane audio (48 kHz, mono, float32)
+    <nazwa>_power.csv      - moc każdego bloku (czas [s], dBm)
+    <nazwa>_spectrum.npz   - średnie widmo i wodospad
+    <nazwa>_spectrum.png   - wodospad (oś X = częstotliwość, oś Y = czas)
+
+Pliki są czytane przez np.memmap blok po bloku (stałe zużycie pamięci),
+a nagrania dzielone między procesy (ProcessPoolExecutor) - jeden plik na proces.
+
+Formaty wejściowe (po rozszerzeniu):
+    .u8 .cu8 .bin  - przeplatane bajty I/Q (jak z rtl_sdr)
+    .cf32 .c64     - complex64
+
+Użycie:
+    python3 batch_decode.py archiwum/ --out wyniki/ --rate 288000 --jobs 4
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+RAW_EXTENSIONS = (".u8", ".cu8", ".bin")
+COMPLEX_EXTENSIONS = (".cf32", ".c64")
+
+
+def find_captures(directory):
+    """Lista nagrań IQ w katalogu (posortowana)."""
+    names = sorted(os.listdir(directory))
+    return [
+        os.path.join(directory, name) for name in names
+        if name.lower().endswith(RAW_EXTENSIONS + COMPLEX_EXTENSIONS)
+    ]
+
+
+def open_capture(path):
+    """Mapuje plik do pamięci. Zwraca (tablica, czy_surowe_bajty)."""
+    if path.lower().endswith(RAW_EXTENSIONS):
+        return np.memmap(path, dtype=np.uint8, mode="r"), True
+    return np.memmap(path, dtype=np.complex64, mode="r"), False
+
+
+def decode_capture(path, out_dir, sample_rate=288e3, audio_rate=48000, block_size=8 * 1024,
+                   fft_size=1024, waterfall_rows=1000):
+    """Dekoduje jedno nagranie. Zwraca słownik z podsumowaniem (wykonywane w procesie roboczym)."""
+    from fm_dsp import FMDemodulator, average_psd, psd_dbm
+    from band_survey import write_png
+    import soundfile as sf
+
+    start = time.perf_counter()
+    demod = FMDemodulator(sample_rate, audio_rate, block_size) # ValueError przy niecałkowitej decymacji
+    fft_size = min(fft_size, block_size)
+    data, raw = open_capture(path)
+    step = 2 * block_size if raw else block_size
+    num_blocks = len(data) // step
+    if num_blocks == 0:
+        return {"path": path, "blocks": 0, "seconds": 0.0, "elapsed": 0.0}
+
+    base = os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0])
+
+    # Widmo: średnia z całego pliku + wodospad z grupowaniem bloków w wiersze
+    window = np.hanning(fft_size).astype(np.float32)
+    blocks_per_row = max(1, int(np.ceil(num_blocks / waterfall_rows)))
+    waterfall = np.zeros((int(np.ceil(num_blocks / blocks_per_row)), fft_size), dtype=np.float64)
+    psd_sum = np.zeros(fft_size, dtype=np.float64)
+    power_log = np.empty(num_blocks, dtype=np.float32)
+
+    with sf.SoundFile(f"{base}.wav", "w", samplerate=int(audio_rate), channels=1, subtype="FLOAT") as wav:
+        for i in range(num_blocks):
+            chunk = data[i * step:(i + 1) * step]
+            samples = demod.load_bytes(chunk) if raw else demod.load_samples(chunk)
+            wav.write(demod.demodulate())
+            power_log[i] = demod.last_dbm
+
+            psd = average_psd(samples, window)
+            psd_sum += psd
+            waterfall[i // blocks_per_row] += psd
+
+    # Średnie w dBm, DC na środku
+    rows_count = np.full(len(waterfall), blocks_per_row, dtype=np.float64)
+    rows_count[-1] = num_blocks - blocks_per_row * (len(waterfall) - 1)
+    mean_dbm = np.fft.fftshift(psd_dbm(psd_sum / num_blocks, window))
+    waterfall_dbm = np.fft.fftshift(psd_dbm(waterfall / rows_count[:, None], window), axes=1).astype(np.float32)
+    freqs = np.fft.fftshift(np.fft.fftfreq(fft_size, 1 / sample_rate))
+
+    times = np.arange(num_blocks) * block_size / sample_rate
+    np.savetxt(f"{base}_power.csv", np.column_stack((times, power_log)), delimiter=",",
+               fmt="%.4f", header="time_s,power_dbm", comments="")
+    np.savez_compressed(f"{base}_spectrum.npz", freqs_offset=freqs, mean_dbm=mean_dbm,
+                        waterfall_dbm=waterfall_dbm, row_seconds=blocks_per_row * block_size / sample_rate)
+    write_png(f"{base}_spectrum.png", waterfall_dbm)
+
+    return {
+        "path": path,
+        "blocks": num_blocks,
+        "seconds": num_blocks * block_size / sample_rate,
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+def decode_directory(directory, out_dir, jobs=None, **options):
+    """Dekoduje wszystkie nagrania równolegle. Zwraca listę podsumowań."""
+    from fm_dsp import check_decimation
+    check_decimation(options.get("sample_rate", 288e3), options.get("audio_rate", 48000))
+    captures = find_captures(directory)
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    results = []
+    if not captures:
+        print(f"Brak nagrań IQ w {directory}")
+        return results
+
+    print(f"Dekodowanie {len(captures)} nagrań w {jobs} procesach...")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(decode_capture, path, out_dir, **options): path for path in captures}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"BŁĄD dekodowania {futures[future]}: {e}")
+                continue
+            results.append(result)
+            speed = result["seconds"] / result["elapsed"] if result["elapsed"] else 0.0
+            print(f"{os.path.basename(result['path'])}: {result['seconds']:.1f} s nagrania "
+                  f"w {result['elapsed']:.1f} s ({speed:.0f}x czasu rzeczywistego)")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Wsadowe dekodowanie nagrań IQ do audio, widma i logu mocy")
+    parser.add_argument("directory", help="Katalog z nagraniami IQ")
+    parser.add_argument("--out", default="decoded", help="Katalog wynikowy")
+    parser.add_argument("--rate", type=float, default=288e3, help="Częstotliwość próbkowania nagrań")
+    parser.add_argument("--jobs", type=int, default=None, help="Liczba procesów (domyślnie: liczba rdzeni)")
+    parser.add_argument("--fft", type=int, default=1024, help="Rozmiar FFT widma")
+    args = parser.parse_args()
+    try:
+        from fm_dsp import check_decimation
+        check_decimation(args.rate, 48000)
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    results = decode_directory(args.directory, args.out, args.jobs, sample_rate=args.rate, fft_size=args.fft)
+    total = sum(r["seconds"] for r in results)
+    print(f"Gotowe: {len(results)} plików, {total / 60:.1f} min nagrań w {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tor DSP odbiornika FM (complex64 / float32, bufory wielokrotnego użytku).
+
+FMDemodulator przydziela wszystkie bufory robocze raz, przy tworzeniu,
+i w każdym bloku korzysta z ufunc z parametrem out=. Surowe bajty z tunera
+trafiają bezpośrednio do bufora complex64 (tablica LUT), z pominięciem
+complex128 zwracanego przez pyrtlsdr.read_samples.
+
+Kolejność w bloku:
+    1. uint8 -> complex64 (LUT), ostatnia próbka poprzedniego bloku na pozycji 0
+    1a. przy strojeniu z offsetem: korekcja DC i niezrównoważenia IQ (IQCorrector)
+        oraz przesunięcie cyfrowe stacji do 0 Hz
+    2. moc bloku (np.vdot - bez tablic pośrednich)
+    3. dyskryminator: x[n] * conj(x[n-1]) -> arctan2
+    4. filtr FIR + decymacja do audio_rate (strumieniowo, z historią)
+    5. normalizacja i głośność, de-emfaza 75 us (z zachowaniem stanu)
+
+Kroki 2-4 mają dwa zaplecza (backend):
+    "numpy" - ufunc z out=, zawsze dostępne,
+    "numba" - skompilowane, połączone pętle na próbkach (pip install numba);
+              skompilowane jądra są zapisywane na dysku (__pycache__),
+              więc kolejne uruchomienia nie płacą za kompilację.
+Domyślnie ("auto") używana jest Numba, jeśli jest zainstalowana i daje się
+zaimportować (inaczej NumPy). Wybór można
+wymusić zmienną środowiskową FM_DSP_BACKEND=numpy|numba.
+Zgodność obu zapleczy sprawdza: python3 fm_dsp.py
+"""
+
+import importlib.util
+import math
+import os
+
+import numpy as np
+from scipy.signal import firwin, lfilter
+
+# Numba jest importowana dopiero przy pierwszej kompilacji jąder (import trwa sekundy)
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None
+
+# Tablica przekodowania uint8 -> float32, zgodna ze skalowaniem pyrtlsdr
+IQ_LUT = (np.arange(256, dtype=np.float32) / np.float32(255 / 2) - np.float32(1.0))
+
+
+def power_dbm(iq):
+    """Średnia moc bloku w dBm (ta sama skala co dotychczasowy S-metr)."""
+    power = np.vdot(iq, iq).real / len(iq)
+    return 10 * np.log10(power + 1e-10) - 30
+
+
+def average_psd(iq, window, out=None):
+    """Średnia |FFT|^2 ramek iq okienkowanych window (bez fftshift); ramki = len(iq) // len(window)."""
+    size = len(window)
+    frames = len(iq) // size
+    spectrum = np.fft.fft(iq[:frames * size].reshape(frames, size) * window, axis=1)
+    return np.mean(spectrum.real ** 2 + spectrum.imag ** 2, axis=0, out=out)
+
+
+def psd_dbm(psd, window):
+    """Moc binów z average_psd w dBm (ta sama skala co power_dbm / S-metr)."""
+    # Korekcja wzmocnienia koherentnego okna (ton o amplitudzie A -> A^2)
+    power_scale = 1.0 / float(np.sum(window)) ** 2
+    return 10 * np.log10(psd * power_scale + 1e-20) - 30
+
+
+def check_decimation(sample_rate, audio_rate):
+    """Współczynnik decymacji do audio_rate. ValueError, gdy nie jest liczbą całkowitą."""
+    decimation = sample_rate / audio_rate
+    if decimation < 1 or decimation != int(decimation):
+        raise ValueError(
+            f"Częstotliwość próbkowania {sample_rate:.0f} Hz musi być całkowitą wielokrotnością "
+            f"częstotliwości audio {audio_rate:.0f} Hz (np. 240000, 288000, 1152000)"
+        )
+    return int(decimation)
+
+
+# === JĄDRA NUMBA ===
+# Czysty Python; kompilowane przez numba.njit tylko, gdy Numba jest dostępna.
+
+def _discriminate_kernel(iq, angle):
+    """Moc (suma |x|^2) i kąt x[n] * conj(x[n-1]) w jednym przebiegu."""
+    acc = 0.0
+    for i in range(angle.shape[0]):
+        a = iq[i + 1]
+        b = iq[i]
+        acc += a.real * a.real + a.imag * a.imag
+        re = a.real * b.real + a.imag * b.imag
+        im = a.imag * b.real - a.real * b.imag
+        angle[i] = math.atan2(im, re)
+    return acc
+
+
+def _fir_decimate_kernel(x, taps, start, d, out):
+    """Filtr FIR liczony tylko dla co d-tej próbki, od indeksu start (x float32 lub complex64)."""
+    numtaps = taps.shape[0]
+    for k in range(out.shape[0]):
+        n = start + k * d
+        acc = x[0] - x[0] # Zero typu x
+        for j in range(numtaps):
+            acc += taps[j] * x[n - j]
+        out[k] = acc
+
+
+_kernels = None
+
+
+def numba_kernels():
+    """
+    Kompiluje (lub wczytuje z cache na dysku) jądra Numba. None, gdy brak Numby.
+    Numba zainstalowana, ale niedziałająca (np. niezgodna wersja NumPy) też daje None
+    - HAVE_NUMBA jest wtedy zerowane, a tor DSP wraca do NumPy.
+    """
+    global _kernels, HAVE_NUMBA
+    if not HAVE_NUMBA:
+        return None
+    if _kernels is None:
+        try:
+            import numba
+            jit = numba.njit(cache=True, nogil=True, fastmath=True)
+            kernels = (jit(_discriminate_kernel), jit(_fir_decimate_kernel))
+            # Kompilacja od razu (Numba kompiluje leniwie) - błędy wychodzą tutaj, a nie w wątku DSP
+            iq = np.zeros(4, dtype=np.complex64)
+            x = np.zeros(4, dtype=np.float32)
+            kernels[0](iq, x[:3])
+            kernels[1](x, x[:2], 1, 1, x[:1])
+            kernels[1](iq, x[:2], 1, 1, iq[:1])
+        except Exception as e:
+            print(f"Nie można użyć Numby ({type(e).__name__}: {e})")
+            HAVE_NUMBA = False
+            return None
+        _kernels = kernels
+    return _kernels
+
+
+def resolve_backend(backend="auto"):
+    """'auto' -> 'numba' lub 'numpy' (z uwzględnieniem FM_DSP_BACKEND)."""
+    if backend == "auto":
+        backend = os.environ.get("FM_DSP_BACKEND", "auto")
+    if backend == "auto":
+        backend = "numba" if HAVE_NUMBA else "numpy"
+    if backend == "numba" and numba_kernels() is None:
+        print("Numba niedostępna - używam zaplecza NumPy.")
+        backend = "numpy"
+    if backend not in ("numpy", "numba"):
+        raise ValueError(f"Nieznane zaplecze DSP: {backend}")
+    return backend
+
+
+class IQCorrector:
+    """
+    Korekcja składowej stałej (DC) i niezrównoważenia IQ tunera, w miejscu.
+
+    Estymatory są aktualizowane wykładniczo raz na blok na podstawie sum,
+    które dają dwa wywołania BLAS bez tablic pośrednich:
+        vdot(x, x) = sum(I^2 + Q^2),   dot(x, x) = sum(I^2 - Q^2) + 2j * sum(I * Q)
+    Korekcja (Gram-Schmidt): Q' = (Q - I * C / P_I) * sqrt(P_I / (P_Q - C^2 / P_I)).
+
+    Przy tuning_offset != 0 tuner jest strojony o offset niżej, a stacja przesuwana
+    cyfrowo do zera - szpilka DC tunera wypada wtedy poza środek kanału.
+    """
+
+    def __init__(self, block_size, sample_rate=288e3, tuning_offset=0.0, alpha=0.05, correct=True):
+        self.block_size = block_size
+        self.alpha = alpha
+        self.correct = correct
+        self.dc = 0j
+        self.p_i = None
+        self.p_q = None
+        self.c_iq = 0.0
+        self.scratch = np.empty(block_size, dtype=np.float32)
+
+        self.tuning_offset = tuning_offset
+        if tuning_offset:
+            w = -2 * np.pi * tuning_offset / sample_rate
+            self.nco = np.exp(1j * w * np.arange(block_size)).astype(np.complex64)
+            self.nco_step = np.exp(1j * w * block_size)
+            self.nco_phase = 1 + 0j
+
+    def process(self, iq):
+        """Koryguje blok complex64 w miejscu."""
+        n = len(iq)
+        if self.correct:
+            self.correct_block(iq)
+
+        # Przesunięcie cyfrowe (ciągła faza między blokami)
+        if self.tuning_offset:
+            np.multiply(iq, self.nco[:n], out=iq)
+            np.multiply(iq, np.complex64(self.nco_phase), out=iq)
+            self.nco_phase *= self.nco_step
+            self.nco_phase /= abs(self.nco_phase)
+        return iq
+
+    def correct_block(self, iq):
+        n = len(iq)
+        a = self.alpha
+        first = self.p_i is None
+
+        # 1. DC
+        block_dc = complex(np.mean(iq))
+        self.dc = block_dc if first else self.dc + a * (block_dc - self.dc)
+        np.subtract(iq, np.complex64(self.dc), out=iq)
+
+        # 2. Niezrównoważenie IQ
+        total = np.vdot(iq, iq).real / n
+        cross = complex(np.dot(iq, iq)) / n
+        p_i = 0.5 * (total + cross.real)
+        p_q = 0.5 * (total - cross.real)
+        c_iq = 0.5 * cross.imag
+        if first:
+            self.p_i, self.p_q, self.c_iq = p_i, p_q, c_iq
+        else:
+            self.p_i += a * (p_i - self.p_i)
+            self.p_q += a * (p_q - self.p_q)
+            self.c_iq += a * (c_iq - self.c_iq)
+
+        if self.p_i > 1e-12:
+            k1 = self.c_iq / self.p_i
+            residual = self.p_q - self.c_iq * k1
+            if residual > 1e-12:
+                k2 = np.sqrt(self.p_i / residual)
+                i_part = iq.real
+                q_part = iq.imag
+                tmp = self.scratch[:n]
+                np.multiply(i_part, np.float32(k1), out=tmp)
+                np.subtract(q_part, tmp, out=q_part)
+                np.multiply(q_part, np.float32(k2), out=q_part)
+
+    def imbalance(self):
+        """Bieżące oszacowanie: (DC, stosunek amplitud Q/I, błąd fazy w stopniach)."""
+        if not self.p_i:
+            return self.dc, 1.0, 0.0
+        ratio = np.sqrt(self.p_q / self.p_i)
+        phase = np.degrees(np.arcsin(np.clip(self.c_iq / np.sqrt(self.p_i * self.p_q), -1, 1)))
+        return self.dc, float(ratio), float(phase)
+
+
+class FIRDecimator:
+    """
+    Strumieniowy filtr FIR z decymacją (float32 lub complex64), prealokowany.
+    Historia numtaps - 1 próbek jest przenoszona między blokami, a filtr liczony
+    tylko dla próbek wyjściowych. Blok wejściowy zapisuje się do self.input.
+    """
+
+    def __init__(self, decimation, block_size, numtaps=63, dtype=np.float32, kernels=None):
+        self.decimation = decimation
+        self.block_size = block_size
+        self.kernels = kernels
+        # Filtr antyaliasingowy jak w signal.decimate (odcięcie 0.8 * Nyquist po decymacji)
+        self.taps = firwin(numtaps, 0.8 / decimation).astype(np.float32)
+        self.history = numtaps - 1
+
+        self.buffer = np.zeros(self.history + block_size, dtype=dtype)
+        self.input = self.buffer[self.history:]
+        self.offset = self.history
+
+        max_out = block_size // decimation + 2
+        self.out = np.empty(max_out, dtype=dtype)
+        self.scratch = np.empty(max_out, dtype=dtype)
+
+    def reset(self):
+        self.buffer[:self.history] = 0
+        self.offset = self.history
+
+    def decimate(self):
+        """Filtruje blok z self.input. Zwraca widok na self.out."""
+        x = self.buffer
+        taps = self.taps
+        d = self.decimation
+        start = self.offset
+        count = (len(x) - start + d - 1) // d
+        stop = start + count * d
+
+        out = self.out[:count]
+        if self.kernels:
+            self.kernels[1](x, taps, start, d, out)
+        else:
+            tmp = self.scratch[:count]
+            np.multiply(x[start:stop:d], taps[0], out=out)
+            for j in range(1, len(taps)):
+                np.multiply(x[start - j:stop - j:d], taps[j], out=tmp)
+                np.add(out, tmp, out=out)
+
+        # Historia dla następnego bloku
+        self.offset = stop - self.block_size
+        x[:self.history] = x[self.block_size:]
+        return out
+
+    def process(self, samples):
+        """Kopiuje blok do self.input i filtruje. Zwraca widok na self.out."""
+        self.input[:] = samples
+        return self.decimate()
+
+
+class FMDemodulator:
+    """Strumieniowy demodulator WBFM z prealokowanymi buforami."""
+
+    def __init__(self, sample_rate=288e3, audio_rate=48000, block_size=8 * 1024,
+                 deemphasis=75e-6, numtaps=63, backend="auto", correct_iq=None, tuning_offset=0.0):
+        self.backend = resolve_backend(backend)
+        self.kernels = numba_kernels() if self.backend == "numba" else None
+        self.sample_rate = sample_rate
+        self.audio_rate = audio_rate
+        self.block_size = block_size
+        # Decymacja o liczbę całkowitą - inaczej audio miałoby inną częstotliwość niż audio_rate
+        self.decimation = check_decimation(sample_rate, audio_rate)
+
+        # IQ: pozycja 0 = ostatnia próbka poprzedniego bloku (ciągłość dyskryminatora)
+        self.iq = np.zeros(block_size + 1, dtype=np.complex64)
+        self.product = np.empty(block_size, dtype=np.complex64)
+        # Dyskryminator pisze bezpośrednio za historią filtra FIR
+        self.fir = FIRDecimator(self.decimation, block_size, numtaps, np.float32, self.kernels)
+        self.angle = self.fir.input
+        self.scratch = np.empty(block_size // self.decimation + 2, dtype=np.float32)
+
+        # De-emfaza: y[n] = (1 - x) * in[n] + x * y[n-1]
+        d = audio_rate * deemphasis
+        x = np.exp(-1 / d)
+        self.deemph_b = np.array([1 - x], dtype=np.float32)
+        self.deemph_a = np.array([1, -x], dtype=np.float32)
+        self.deemph_zi = np.zeros(1, dtype=np.float32)
+
+        # Korekcja DC/IQ i przesunięcie przy strojeniu z offsetem. Domyślnie tylko z offsetem:
+        # bez niego nośna stacji leży na 0 Hz i estymator DC usuwałby ją razem ze szpilką tunera
+        if correct_iq is None:
+            correct_iq = bool(tuning_offset)
+        self.corrector = None
+        if correct_iq or tuning_offset:
+            self.corrector = IQCorrector(block_size, sample_rate, tuning_offset, correct=correct_iq)
+        self.tuning_offset = tuning_offset
+
+        self.last_dbm = -120.0
+
+    def reset(self):
+        """Czyści stan strumienia (np. po zmianie częstotliwości)."""
+        self.iq[0] = 0
+        self.fir.reset()
+        self.deemph_zi[:] = 0
+
+    # === WEJŚCIE ===
+
+    @property
+    def samples(self):
+        """Bieżący blok IQ (widok na bufor roboczy - nadpisywany co blok)."""
+        return self.iq[1:]
+
+    def load_bytes(self, raw):
+        """Przekodowuje surowe bajty uint8 (I, Q, I, Q...) do bufora complex64."""
+        raw = np.frombuffer(raw, dtype=np.uint8, count=2 * self.block_size)
+        np.take(IQ_LUT, raw, out=self.iq[1:].view(np.float32))
+        return self.samples
+
+    def load_samples(self, samples):
+        """Kopiuje gotowe próbki zespolone (dowolnej precyzji) do bufora complex64."""
+        self.iq[1:] = samples
+        return self.samples
+
+    def read_block(self, sdr):
+        """Czyta jeden blok z tunera (RtlSdr lub RtlTcpSource) prosto do bufora."""
+        return self.load_bytes(sdr.read_bytes(2 * self.block_size))
+
+    # === PRZETWARZANIE ===
+
+    def discriminate(self):
+        """Moc bloku i kąt x[n] * conj(x[n-1]) zapisany do self.angle."""
+        iq = self.iq
+        if self.kernels:
+            power = self.kernels[0](iq, self.angle) / self.block_size
+            self.last_dbm = 10 * np.log10(power + 1e-10) - 30
+            iq[0] = iq[-1]
+            return self.last_dbm
+        self.last_dbm = power_dbm(iq[1:])
+        np.conjugate(iq[:-1], out=self.product)
+        np.multiply(iq[1:], self.product, out=self.product)
+        np.arctan2(self.product.imag, self.product.real, out=self.angle)
+        iq[0] = iq[-1]
+        return self.last_dbm
+
+    def decimate(self):
+        """Filtr FIR + decymacja do audio_rate. Zwraca widok na bufor wyjściowy filtra."""
+        return self.fir.decimate()
+
+    def demodulate(self, volume=1.0):
+        """Przetwarza bieżący blok. Zwraca nową tablicę audio float32 (bezpieczną dla kolejki)."""
+        if self.corrector:
+            self.corrector.process(self.iq[1:])
+        self.discriminate()
+        audio = self.decimate()
+
+        np.abs(audio, out=self.scratch[:len(audio)])
+        audio_max = self.scratch[:len(audio)].max()
+        gain = volume / audio_max if audio_max > 1e-5 else volume
+        np.multiply(audio, np.float32(gain), out=audio)
+
+        out, self.deemph_zi = lfilter(self.deemph_b, self.deemph_a, audio, zi=self.deemph_zi)
+        return out
+
+    def process(self, samples, volume=1.0):
+        """Skrót: załaduj gotowe próbki i zdemoduluj."""
+        self.load_samples(samples)
+        return self.demodulate(volume)
+
+
+# === ZGODNOŚĆ ZAPLECZY ===
+
+def fm_test_bytes(num_samples, tone=1000.0, deviation=75e3, sample_rate=288e3,
+                  amplitude=0.5, noise=0.02, seed=0):
+    """Surowe bajty uint8 (jak z tunera) z sygnałem FM modulowanym tonem."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(num_samples) / sample_rate
+    phase = 2 * np.pi * deviation * np.cumsum(np.sin(2 * np.pi * tone * t)) / sample_rate
+    iq = amplitude * np.exp(1j * phase)
+    iq += noise * (rng.standard_normal(num_samples) + 1j * rng.standard_normal(num_samples))
+    interleaved = np.empty(2 * num_samples)
+    interleaved[0::2] = iq.real
+    interleaved[1::2] = iq.imag
+    return np.clip(np.round((interleaved + 1) * 127.5), 0, 255).astype(np.uint8)
+
+
+def compare_backends(blocks=20, block_size=8 * 1024):
+    """
+    Przepuszcza ten sam sygnał FM przez oba zaplecza.
+    Zwraca (maks. różnica audio, maks. różnica dBm) albo None, gdy brak Numby.
+    """
+    if numba_kernels() is None:
+        return None
+    raw = fm_test_bytes(blocks * block_size)
+    ref = FMDemodulator(block_size=block_size, backend="numpy")
+    fast = FMDemodulator(block_size=block_size, backend="numba")
+    audio_diff = 0.0
+    dbm_diff = 0.0
+    for i in range(blocks):
+        block = raw[2 * i * block_size:2 * (i + 1) * block_size]
+        ref.load_bytes(block)
+        fast.load_bytes(block)
+        a = ref.demodulate()
+        b = fast.demodulate()
+        audio_diff = max(audio_diff, float(np.max(np.abs(a - b))))
+        dbm_diff = max(dbm_diff, abs(ref.last_dbm - fast.last_dbm))
+    return audio_diff, dbm_diff
+
+
+if __name__ == "__main__":
+    import time
+
+    result = compare_backends()
+    if result is None:
+        print("Numba niedostępna - dostępne tylko zaplecze NumPy.")
+    else:
+        audio_diff, dbm_diff = result
+        print(f"Różnica NumPy/Numba: audio {audio_diff:.2e}, moc {dbm_diff:.2e} dB")
+        if audio_diff > 1e-4 or dbm_diff > 1e-3:
+            raise SystemExit("BŁĄD: zaplecza dają różne wyniki!")
+
+    raw = fm_test_bytes(8 * 1024)
+    for backend in ("numpy", "numba") if HAVE_NUMBA else ("numpy",):
+        demod = FMDemodulator(backend=backend)
+        demod.load_bytes(raw)
+        demod.demodulate()
+        start = time.perf_counter()
+        for _ in range(200):
+            demod.demodulate()
+        elapsed = (time.perf_counter() - start) / 200
+        print(f"{backend}: {elapsed * 1e3:.3f} ms / blok")
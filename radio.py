@@ -7,26 +7,55 @@ RTL-SDR Blog V4 Compatible
 (Wersja 19 - Poprawione etykiety na podziałce widma)
 """
 
-import customtkinter as ctk
-from rtlsdr import RtlSdr
-import numpy as np
-import sounddevice as sd
-from scipy import signal
-from scipy.signal import butter, lfilter, resample_poly
+import time
+_START_TIME = time.perf_counter()
+
+import atexit
+import importlib
+import sys
 import threading
 import queue
-import time
+import tkinter
 from datetime import datetime
-import soundfile as sf
 import json 
 import os 
 
+# Pomiar czasu startu: (moduł/etap, sekundy). Wypisywany przy --profile-startup.
+startup_times = []
+
+def timed_import(name):
+    """
+    Importuje moduł i zapisuje koszt pierwszego importu.
+    Zawsze przez importlib - jeśli wątek rozgrzewki właśnie importuje ten moduł,
+    blokada importu zaczeka na jego pełne wczytanie.
+    """
+    first = name not in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if first:
+        startup_times.append((f"import {name}", time.perf_counter() - start))
+    return module
+
+def print_startup_report():
+    """Wypisuje koszt importów i inicjalizacji zebrany w startup_times."""
+    print("=== Czas startu ===")
+    for name, seconds in list(startup_times):
+        print(f"{name:<40} {seconds * 1000:9.1f} ms")
+
+# Ciężkie moduły (scipy przez fm_dsp, rtlsdr, sounddevice, soundfile, numba)
+# są ładowane dopiero przy pierwszym użyciu albo w tle po pokazaniu okna.
+ctk = timed_import("customtkinter")
+np = timed_import("numpy")
+
+from radio_engine import RadioEngine, TunerCache
+
 # Konfiguracja CustomTkinter
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
 class SDRRadio(ctk.CTk):
     def __init__(self):
+        init_start = time.perf_counter()
         super().__init__()
 
         # Konfiguracja okna
@@ -34,33 +63,38 @@ class SDRRadio(ctk.CTk):
         self.geometry("1200x600") 
         
         # Zmienne SDR
-        self.sdr = None
         self.is_running = False
-        self.audio_queue = queue.Queue(maxsize=10)
         self.current_freq = 100.0e6
         self.sample_rate = 288e3 
         self.audio_rate = 48000
+        self.block_size = 8 * 1024
+        # Strojenie tunera o offset poniżej stacji + cyfrowe przesunięcie (szpilka DC poza środkiem kanału)
+        self.tuning_offset = 0.0
+        self.correct_iq = None # None = korekcja DC/IQ tylko przy strojeniu z offsetem
         self.gain = 'auto' 
         self.volume = 0.5
         self.recording = False
-        self.record_buffer = []
+        self.audio_thread = None
+        
+        # Pętla DSP i skaner (radio_engine.RadioEngine, bez Tk): komendy do wątku DSP
+        # (jedyny pisarz stanu tunera), migawki stanu z powrotem oraz zdarzenia dla GUI
+        self.engine = RadioEngine(TunerCache(), self.audio_rate, self.current_freq, self.gain)
+        self.engine.tuner_cache.load()
+        self.ui_pump_id = None
+        self.wake_fds = self.setup_ui_wakeup()
+        
+        # Zdalny tuner rtl_tcp ("host:port"); None = lokalny klucz USB
+        self.rtl_tcp_address = None
         
         # Tryb jest stały - tylko FM
         self.mode = "FM"
         
-        # Zmienne optymalizacyjne
-        self.current_dbm = -120.0 
-        self.last_spectrum_update = 0 
-        
         # Zmienne do obsługi stabilnego rozmiaru
         self.is_resizing = False
         self.resize_timer = None
         
         # Zmienne skanera
         self.is_scanning = False
-        self.scan_thread = None
-        self.scan_paused_on_freq = False 
-        self.scan_pause_time = 0      
         
         # Logika zapisanych stacji
         self.stations_file = "stations.json"
@@ -68,11 +102,15 @@ class SDRRadio(ctk.CTk):
         self.load_stations_from_file() 
         
         self.setup_ui()
-        self.update_s_meter()
         
         # Bindowanie zmiany rozmiaru okna
         self.bind("<Configure>", self.on_resize)
         
+        startup_times.append(("SDRRadio.__init__ (UI)", time.perf_counter() - init_start))
+        self.first_audio_logged = False
+        self.profile_startup = False
+        self.after_idle(self.start_warmup)
+        
     def setup_ui(self):
         # Konfiguracja siatki (Grid)
         self.grid_rowconfigure(0, weight=1)
@@ -292,11 +330,86 @@ class SDRRadio(ctk.CTk):
             self.gain_label.configure(text=f"{self.gain:.1f} dB")
             self.log_info(f"Wzmacniacz: Ręczny ({self.gain} dB)")
         
-        if self.is_running and self.sdr:
+        self.send_command("gain", self.gain)
+
+    # === KOMUNIKACJA MIĘDZY WĄTKAMI ===
+
+    def send_command(self, name, value=None):
+        """Jedyny kanał zmian stanu tunera: komendy wykonuje process_sdr między blokami."""
+        self.engine.send_command(name, value)
+
+    def setup_ui_wakeup(self):
+        """
+        Budzenie pętli Tk przez potok: wątek roboczy po dodaniu zdarzenia zapisuje bajt,
+        a Tk obsługuje deskryptor jak każde inne zdarzenie - bez odpytywania after().
+        Bez createfilehandler (Windows) zwraca None i GUI odpytuje kolejkę co 50 ms.
+        """
+        if not hasattr(self.tk, "createfilehandler"):
+            return None
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False) # Wątek roboczy nigdy nie czeka na GUI
+        self.tk.createfilehandler(read_fd, tkinter.READABLE, self.on_ui_wakeup)
+        self.engine.notify = self.wake_ui
+        return read_fd, write_fd
+
+    def wake_ui(self):
+        """Wołana z wątków roboczych - tylko zapis do potoku, bez wywołań Tk."""
+        try:
+            os.write(self.wake_fds[1], b"\0")
+        except BlockingIOError:
+            pass # Potok pełny - przebudzenie i tak czeka na obsłużenie
+
+    def on_ui_wakeup(self, fd, mask):
+        try:
+            os.read(fd, 4096)
+        except BlockingIOError:
+            pass
+        self.pump_ui_events()
+
+    def close_ui_wakeup(self):
+        if self.wake_fds:
+            self.engine.notify = None
+            self.tk.deletefilehandler(self.wake_fds[0])
+            for fd in self.wake_fds:
+                os.close(fd)
+            self.wake_fds = None
+
+    def pump_ui_events(self):
+        """Wykonuje zdarzenia z wątków roboczych w wątku Tk (po przebudzeniu przez potok)."""
+        self.ui_pump_id = None
+        while True:
             try:
-                self.sdr.gain = self.gain
+                handler, args = self.engine.ui_events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                getattr(self, handler)(*args)
+            except Exception as e:
+                print(f"Błąd obsługi zdarzenia GUI: {e}")
+        
+        if self.is_running and not self.wake_fds:
+            self.ui_pump_id = self.after(50, self.pump_ui_events)
+
+    def start_warmup(self):
+        """Po pokazaniu okna ładuje w tle moduły potrzebne dopiero przy starcie radia."""
+        threading.Thread(target=self.warmup_worker, daemon=True).start()
+
+    def warmup_worker(self):
+        start = time.perf_counter()
+        for name in ("fm_dsp", "rtlsdr", "sounddevice"):
+            try:
+                timed_import(name)
             except Exception as e:
-                print(f"Błąd ustawiania wzmocnienia: {e}")
+                print(f"Nie można wczytać modułu {name}: {e}")
+        try:
+            fm_dsp = sys.modules["fm_dsp"]
+            kernels_start = time.perf_counter()
+            if fm_dsp.resolve_backend() == "numba": # Kompiluje jądra albo wraca do NumPy
+                startup_times.append(("jądra Numba (kompilacja/cache)", time.perf_counter() - kernels_start))
+        except Exception as e:
+            print(f"Błąd przygotowania jąder DSP: {e}")
+        startup_times.append(("rozgrzewka w tle (razem)", time.perf_counter() - start))
 
     def on_resize(self, event):
         """Kluczowa funkcja stabilności: Pauzuje spektrum podczas zmiany rozmiaru."""
@@ -337,13 +450,7 @@ class SDRRadio(ctk.CTk):
         """Uruchamia lub zatrzymuje skanowanie stacji."""
         if self.is_scanning:
             self.is_scanning = False
-            self.scan_paused_on_freq = False 
-            if self.scan_thread:
-                try:
-                    self.scan_thread.join(timeout=0.1) 
-                except Exception as e:
-                    print(f"Błąd przyłączania wątku skanera: {e}")
-            self.scan_thread = None
+            self.engine.stop_scan()
             self.scan_button.configure(text="Skanuj Pasmo FM ▶")
             self.log_info("Skanowanie zatrzymane przez użytkownika.")
             return
@@ -353,86 +460,23 @@ class SDRRadio(ctk.CTk):
             return
             
         self.is_scanning = True
-        self.scan_paused_on_freq = False 
         self.scan_button.configure(text="Stop ■")
         self.log_info("Rozpoczynanie skanowania pasma FM (87.5-108 MHz)...")
-        
-        self.scan_thread = threading.Thread(
-            target=self.scan_worker, 
-            args=(87.5e6, 108e6, 100e3, -35.0), # Próg -35dBm (tylko mocne stacje)
-            daemon=True
-        )
-        self.scan_thread.start()
-
-    def scan_worker(self, f_min, f_max, f_step, threshold_dbm):
-        """Wątek roboczy do skanowania stacji (logika peak-finding)."""
-        freq = self.current_freq
-        if not (f_min <= freq <= f_max):
-             freq = f_min 
-        
-        squelch_threshold_dbm = threshold_dbm - 5.0 
-        pause_duration = 5.0 
-
-        last_dbm = -120.0
-        is_climbing = False 
-
-        while self.is_scanning:
-            try:
-                if self.scan_paused_on_freq:
-                    # === FAZA PAUZY ===
-                    time_elapsed = time.time() - self.scan_pause_time
-                    
-                    if self.current_dbm < squelch_threshold_dbm or time_elapsed > pause_duration:
-                        self.scan_paused_on_freq = False
-                        last_dbm = -120.0 
-                        is_climbing = False 
-                        self.after(0, self.log_info, f"Scan: Wznawiam skanowanie... (Sygnał: {self.current_dbm:.1f} dBm)")
-                    else:
-                        time.sleep(0.2) 
-                        
-                else:
-                    # === FAZA SKANOWANIA ===
-                    freq += f_step
-                    if freq > f_max:
-                        freq = f_min 
-                    
-                    self.after(0, self.set_frequency_from_thread, freq)
-                    time.sleep(0.03) 
-                    
-                    current_dbm_val = self.current_dbm
-                    
-                    if current_dbm_val > last_dbm:
-                        if current_dbm_val > threshold_dbm:
-                            is_climbing = True
-                    
-                    if current_dbm_val < last_dbm:
-                        if is_climbing:
-                            peak_freq = freq - f_step
-                            self.after(0, self.log_info, f"Scan: Znaleziono szczyt na {peak_freq/1e6:.1f} MHz ({last_dbm:.1f} dBm). Pauza.")
-                            self.scan_paused_on_freq = True
-                            self.scan_pause_time = time.time()
-                            self.after(0, self.set_frequency_from_thread, peak_freq)
-                            is_climbing = False 
-                    
-                    last_dbm = current_dbm_val
-            
-            except Exception as e:
-                print(f"Błąd w pętli skanera: {e}")
-                time.sleep(0.1)
-                
-        self.after(0, self.stop_scan_ui)
+        self.engine.start_scan(87.5e6, 108e6, 100e3, -35.0) # Próg -35dBm (tylko mocne stacje)
 
+    def on_scan_hit(self, freq, dbm, known):
+        """Skaner zatrzymał się na stacji (wołana w wątku Tk)."""
+        if known:
+            self.log_info(f"Scan: Znany kanał {freq/1e6:.1f} MHz aktywny ({dbm:.1f} dBm). Pauza.")
+        else:
+            self.log_info(f"Scan: Znaleziono szczyt na {freq/1e6:.1f} MHz ({dbm:.1f} dBm). Pauza.")
 
     def set_frequency_from_thread(self, freq):
-        """Bezpieczna funkcja do ustawiania częstotliwości z wątku."""
+        """Aktualizuje częstotliwość GUI po przestrojeniu przez skaner (wołana w wątku Tk)."""
+        if not self.is_scanning:
+            return # Zdarzenie spóźnione - użytkownik przestroił ręcznie
         self.current_freq = freq
-        self.update_freq_display() # Aktualizuj etykietę (pętla audio zmieni SDR)
-
-    def stop_scan_ui(self):
-        """Bezpieczna funkcja do aktualizacji UI po zakończeniu skanowania."""
-        if self.is_scanning:
-            self.is_scanning = False
-        self.scan_button.configure(text="Skanuj Pasmo FM ▶")
+        self.update_freq_display()
 
     # === FUNKCJE ZARZĄDZANIA STACJAMI ===
 
@@ -545,29 +589,31 @@ class SDRRadio(ctk.CTk):
             return
 
         freq = station['freq']
-        self.current_freq = freq * 1e6
-        
-        self.update_freq_display()
+        self.tune(freq * 1e6)
         self.log_info(f"Strojenie do: {station['name']} - {station['freq']} MHz")
 
     # === PODSTAWOWE FUNKCJE RADIA ===
 
     def change_frequency(self, step):
         if self.is_scanning: self.toggle_scan() 
-        self.current_freq += step * 1e6
-        self.current_freq = max(87.5e6, min(108e6, self.current_freq)) 
-        self.update_freq_display()
+        freq = self.current_freq + step * 1e6
+        self.tune(max(87.5e6, min(108e6, freq)))
 
     def set_frequency_manual(self):
         if self.is_scanning: self.toggle_scan() 
         try:
             freq_mhz = float(self.freq_entry.get())
-            self.current_freq = freq_mhz * 1e6
-            self.update_freq_display()
+            self.tune(freq_mhz * 1e6)
             self.log_info(f"Frequency set to {freq_mhz} MHz")
         except ValueError:
             self.log_info("Invalid frequency format!")
 
+    def tune(self, freq):
+        """Strojenie z wątku Tk: etykieta + komenda dla pętli DSP."""
+        self.current_freq = freq
+        self.update_freq_display()
+        self.send_command("tune", freq)
+
     def update_freq_display(self):
         """Aktualizuje TYLKO etykietę GUI. Częstotliwość SDR jest ustawiana w pętli process_sdr."""
         freq_mhz = self.current_freq / 1e6
@@ -576,18 +622,14 @@ class SDRRadio(ctk.CTk):
     def set_volume(self, value):
         self.volume = float(value)
         self.volume_label.configure(text=f"{int(value * 100)}%")
+        self.send_command("volume", self.volume)
 
     def set_gain(self, value):
         """Ustawia ręczne wzmocnienie, jeśli AGC jest wyłączone."""
         if not self.agc_checkbox.get():
             self.gain = float(value)
             self.gain_label.configure(text=f"{self.gain:.1f} dB")
-            if self.is_running and self.sdr:
-                try:
-                    self.sdr.gain = self.gain
-                except Exception as e:
-                    print(f"Błąd ustawiania wzmocnienia: {e}")
-
+            self.send_command("gain", self.gain)
 
     def toggle_radio(self):
         if not self.is_running:
@@ -595,141 +637,113 @@ class SDRRadio(ctk.CTk):
         else:
             self.stop_radio()
 
+    def open_sdr(self):
+        """Zwraca źródło IQ: lokalny RtlSdr albo zdalny tuner rtl_tcp."""
+        if self.rtl_tcp_address:
+            from rtl_tcp_source import RtlTcpSource, parse_address
+            host, port = parse_address(self.rtl_tcp_address)
+            self.log_info(f"Łączenie z rtl_tcp {host}:{port}...")
+            return RtlTcpSource(host, port)
+        return timed_import("rtlsdr").RtlSdr()
+
     def start_radio(self):
+        sdr = None
         try:
-            self.sdr = RtlSdr()
-            self.sdr.sample_rate = self.sample_rate
-            self.sdr.center_freq = self.current_freq
-            self.sdr.gain = self.gain 
+            sdr = self.open_sdr()
+            sdr.sample_rate = self.sample_rate
+            sdr.center_freq = self.current_freq - self.tuning_offset
+            sdr.gain = self.gain 
+            
+            demod = timed_import("fm_dsp").FMDemodulator(
+                self.sample_rate, self.audio_rate, self.block_size,
+                correct_iq=self.correct_iq, tuning_offset=self.tuning_offset
+            )
             
             self.is_running = True
             self.start_btn.configure(text="⏸️ STOP RADIO", fg_color=("#ff3333", "#cc0000"))
             self.status_label.configure(text="🟢 Online", text_color=("#00ff00", "#00ff00"))
             
-            while not self.audio_queue.empty():
-                self.audio_queue.get()
-            
-            self.processing_thread = threading.Thread(target=self.process_sdr, daemon=True)
-            self.processing_thread.start()
+            self.engine.start(sdr, demod, self.current_freq, self.gain, self.volume, self.recording)
             
             self.audio_thread = threading.Thread(target=self.play_audio, daemon=True)
             self.audio_thread.start()
             
+            self.pump_ui_events()
             self.log_info("Radio started successfully!")
             
         except Exception as e:
             self.log_info(f"Błąd startu radia: {e}")
             self.log_info("Sprawdź, czy RTL-SDR jest podłączony i nie jest używany.")
             self.is_running = False
+            if sdr and self.engine.sdr is not sdr:
+                sdr.close()
 
     def stop_radio(self):
+        """Deterministyczne zatrzymanie: skaner i wątek DSP (RadioEngine.stop), potem wątek audio."""
         if self.is_scanning: self.toggle_scan() 
         self.is_running = False
         
-        time.sleep(0.1) 
+        if not self.engine.stop():
+            self.log_info("BŁĄD: wątek SDR nie zakończył się - odłącz tuner i uruchom program ponownie.")
+        self.engine.tuner_cache.save()
+        self.log_iq_imbalance()
         
-        if self.sdr:
+        if self.audio_thread:
             try:
-                self.sdr.close()
-            except Exception as e:
-                print(f"Error closing SDR: {e}")
-            self.sdr = None
+                self.engine.audio_queue.put(None, timeout=1.0) # Sygnał końca dla wątku audio
+            except queue.Full:
+                pass
+            self.audio_thread.join(timeout=2.0)
+        self.audio_thread = None
+        
+        if self.ui_pump_id:
+            self.after_cancel(self.ui_pump_id)
+        self.pump_ui_events() # Dokończ zdarzenia z zatrzymanych wątków (np. zapis nagrania)
         
         self.start_btn.configure(text="▶️ START RADIO", fg_color=("#00ff00", "#00cc00"))
         self.status_label.configure(text="⚫ Offline", text_color=("#ff3333", "#ff3333"))
         self.log_info("Radio stopped")
 
-    # === GŁÓWNA PĘTLA PRZETWARZANIA ===
-
-    def process_sdr(self):
-        """Kluczowa pętla przetwarzania, z wbudowanym niezawodnym skanerem."""
-        
-        while self.is_running:
-            try:
-                # 1. Ustaw częstotliwość w tym wątku
-                if self.sdr.center_freq != self.current_freq:
-                    try:
-                        self.sdr.center_freq = self.current_freq
-                    except Exception as e:
-                        print(f"Błąd ustawiania freq: {e}")
-                                
-                # 2. Odczytaj próbki (SZYBCIEJ)
-                samples = self.sdr.read_samples(8 * 1024) 
-                
-                # 3. Oblicz moc (kluczowe dla skanera)
-                self.current_dbm = 10 * np.log10(np.mean(np.abs(samples) ** 2) + 1e-10) - 30
-                
-                # 4. Demoduluj audio
-                audio = self.fm_demodulate(samples)
-                
-                # 5. Wrzuć do kolejki
-                if self.is_running:
-                    self.audio_queue.put(audio, timeout=0.5)
-                
-                # 6. Aktualizuj spektrum (jeśli można)
-                now = time.time()
-                if (now - self.last_spectrum_update > 0.1) and (not self.is_resizing): 
-                    self.after(0, self.update_spectrum, samples)
-                    self.last_spectrum_update = now
-
-            except queue.Full:
-                pass 
-            except Exception as e:
-                if self.is_running:
-                    print(f"Błąd pętli SDR: {e}")
-                break 
+    def log_iq_imbalance(self):
+        """Wypisuje ostatnie oszacowanie korektora IQ (DC, Q/I, faza) - diagnostyka tunera."""
+        demod = self.engine.demod
+        if not demod or not demod.corrector or not demod.corrector.correct:
+            return
+        dc, ratio, phase = demod.corrector.imbalance()
+        self.log_info(f"Korekcja IQ: DC {abs(dc):.4f}, Q/I {ratio:.3f}, faza {phase:+.2f}°")
 
-    # === FUNKCJA DEMODULACJI ===
-    
-    def fm_demodulate(self, samples):
-        """Demodulacja Wide-Band FM (dla stacji radiowych)."""
-        try:
-            angle = np.angle(samples[1:] * np.conj(samples[:-1]))
-            
-            decimation = int(self.sample_rate / self.audio_rate) 
-            audio = signal.decimate(angle, decimation, zero_phase=True)
-            
-            audio_max = np.max(np.abs(audio))
-            if audio_max > 1e-5: 
-                audio = audio / audio_max * self.volume
-            else:
-                audio = audio * self.volume
-            
-            d = self.audio_rate * 75e-6 
-            x = np.exp(-1 / d)
-            b = [1 - x]
-            a = [1 -x] 
-            audio = lfilter(b, a, audio)
-            
-            if self.recording:
-                self.record_buffer.extend(audio.tolist())
-            
-            return audio.astype(np.float32)
-        except Exception as e:
-            print(f"Błąd demodulacji FM: {e}")
-            return np.zeros(int(self.audio_rate / 20), dtype=np.float32) # Zwróć ciszę
+    def update_gain_display(self, gain):
+        if self.gain != 'auto':
+            self.gain = gain
+            self.gain_slider.set(gain)
+            self.gain_label.configure(text=f"{gain:.1f} dB")
 
     # === FUNKCJE AUDIO I WIDMA ===
 
     def play_audio(self):
-        """Osobny wątek only do odtwarzania audio z kolejki."""
+        """Osobny wątek only do odtwarzania audio z kolejki. Kończy się po odebraniu None."""
         try:
+            sd = timed_import("sounddevice")
             stream = sd.OutputStream(samplerate=self.audio_rate, channels=1, dtype='float32', blocksize=int(self.audio_rate / 20)) 
             stream.start()
         except Exception as e:
             print(f"Błąd otwierania strumienia audio: {e}")
-            self.log_info(f"Błąd audio: {e}")
+            self.engine.post_ui("log_info", f"Błąd audio: {e}")
             return
         
-        while self.is_running:
+        while True:
             try:
-                audio = self.audio_queue.get(timeout=1.0) 
-                stream.write(audio)
-                self.audio_queue.task_done()
-            except queue.Empty:
-                if not self.is_running:
+                audio = self.engine.audio_queue.get() 
+                if audio is None:
                     break
-                continue
+                stream.write(audio)
+                if self.profile_startup and not self.first_audio_logged:
+                    self.first_audio_logged = True
+                    elapsed = time.perf_counter() - _START_TIME
+                    startup_times.append(("start -> pierwsze audio", elapsed))
+                    print(f"Czas od uruchomienia do pierwszego audio: {elapsed:.2f} s")
+                    print_startup_report()
+                    atexit.unregister(print_startup_report) # Raport już wypisany
             except Exception as e:
                 print(f"Błąd odtwarzania audio: {e}")
                 break
@@ -742,7 +756,7 @@ class SDRRadio(ctk.CTk):
 
     # === ZMODYFIKOWANA FUNKCJA RYSOWANIA WIDMA (z poprawką) ===
     
-    def update_spectrum(self, samples):
+    def update_spectrum(self, samples, center_freq):
         """Rysuje spektrum ORAZ podziałkę częstotliwości."""
         if not self.is_running or self.is_resizing: 
             return
@@ -766,7 +780,6 @@ class SDRRadio(ctk.CTk):
                 
                 plot_height = height - 10 - scale_bottom_margin # Wysokość samego wykresu
                 
-                center_freq = self.current_freq
                 bw = self.sample_rate
                 f_min = center_freq - (bw / 2)
                 f_max = center_freq + (bw / 2)
@@ -837,17 +850,15 @@ class SDRRadio(ctk.CTk):
 
     # === RESZTA FUNKCJI (BEZ ZMIAN) ===
     
-    def update_s_meter(self):
-        """Aktualizuje S-metr na podstawie wartości z pętli process_sdr."""
+    def on_status(self, status):
+        """Aktualizuje S-metr na podstawie migawki stanu z pętli process_sdr."""
         if self.is_running:
-            dbm = self.current_dbm
+            dbm = status.dbm
             s_value = int((dbm + 127) / 6)
             s_value = max(0, min(9, s_value))
             
             self.s_value_label.configure(text=f"S{s_value} | {dbm:.1f} dBm")
             self.draw_s_meter(s_value)
-        
-        self.after(200, self.update_s_meter) # Aktualizuj S-metr co 200ms
 
     def draw_s_meter(self, s_value):
         canvas = self.s_meter_canvas
@@ -871,21 +882,20 @@ class SDRRadio(ctk.CTk):
     def toggle_recording(self):
         if not self.recording:
             self.recording = True
-            self.record_buffer = []
+            self.send_command("record", True)
             self.record_btn.configure(text="⏹️ STOP REC", fg_color=("#ffaa00", "#ff8800"))
             self.log_info("Recording started...")
         else:
             self.recording = False
+            self.send_command("record", False) # Pętla DSP odda bufor do save_recording
             self.record_btn.configure(text="⏺️ RECORD", fg_color=("#ff3333", "#cc0000"))
-            self.save_recording()
 
-    def save_recording(self):
-        if len(self.record_buffer) > 0:
+    def save_recording(self, record_buffer):
+        if len(record_buffer) > 0:
             filename = f"recording_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
-            audio_data = np.array(self.record_buffer, dtype=np.float32)
-            sf.write(filename, audio_data, int(self.audio_rate))
+            audio_data = np.concatenate(record_buffer)
+            timed_import("soundfile").write(filename, audio_data, int(self.audio_rate))
             self.log_info(f"Recording saved: {filename}")
-            self.record_buffer = []
 
     def log_info(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -898,10 +908,45 @@ class SDRRadio(ctk.CTk):
     def on_closing(self):
         """Wywoływane przy zamykaniu okna."""
         self.stop_radio()
+        if self.engine.stream_server:
+            self.engine.stream_server.stop()
         self.save_stations_to_file() 
+        self.close_ui_wakeup()
         self.destroy()
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Global FM Radio")
+    parser.add_argument("--profile-startup", action="store_true", help="Wypisz koszt importów i inicjalizacji oraz czas do pierwszego audio")
+    parser.add_argument("--autostart", action="store_true", help="Uruchom radio od razu po pokazaniu okna")
+    parser.add_argument("--tuning-offset", type=float, default=0.0, metavar="HZ", help="Strojenie tunera o HZ poniżej stacji (szpilka DC poza środkiem kanału)")
+    parser.add_argument("--no-iq-correction", action="store_true", help="Wyłącz korekcję DC/IQ także przy strojeniu z offsetem")
+    parser.add_argument("--rtl-tcp", metavar="HOST:PORT", help="Użyj zdalnego tunera przez protokół rtl_tcp")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Uruchom serwer strumieniowy audio/IQ na podanym porcie")
+    parser.add_argument("--serve-host", default="0.0.0.0")
+    parser.add_argument("--serve-codec", choices=["pcm", "opus"], default="pcm")
+    parser.add_argument("--serve-iq-decimation", type=int, default=4)
+    args = parser.parse_args()
+
     app = SDRRadio()
+    app.rtl_tcp_address = args.rtl_tcp
+    app.tuning_offset = args.tuning_offset
+    if args.no_iq_correction:
+        app.correct_iq = False
+    if args.profile_startup:
+        app.profile_startup = True
+        atexit.register(print_startup_report)
+    if args.serve is not None:
+        from audio_server import AudioStreamServer
+        app.engine.stream_server = AudioStreamServer(
+            host=args.serve_host, port=args.serve, audio_rate=app.audio_rate,
+            codec=args.serve_codec, iq_rate=app.sample_rate,
+            iq_decimation=args.serve_iq_decimation
+        )
+        app.engine.stream_server.start()
+        app.log_info(f"Serwer strumieniowy: port {app.engine.stream_server.port}")
+    if args.autostart:
+        app.after_idle(app.start_radio)
     app.protocol("WM_DELETE_WINDOW", app.on_closing)
     app.mainloop()
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Wątki robocze odbiornika bez GUI: pętla DSP (process_sdr) i skaner.
+
+RadioEngine nie importuje Tk - radio.py tylko wysyła mu komendy i obsługuje
+zdarzenia z kolejki ui_events, a testy (tests/) mogą uruchamiać tę samą pętlę
+z udawanym tunerem na maszynie bez ekranu i bez klucza RTL-SDR.
+
+Zdarzenia dla GUI to krotki (nazwa_metody, argumenty), np. ("on_status", (status,)).
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+class TunerCache:
+    """
+    Pamięć ustawień tunera per częstotliwość (LRU): ostatnio użyte ręczne wzmocnienie,
+    ostatnio zmierzona moc i szacowany czas ustalenia po przestrojeniu.
+    Zapamiętywane jest wzmocnienie ustawione przez użytkownika przy opuszczaniu kanału, a nie
+    "najlepsze" - zmierzona moc rośnie razem ze wzmocnieniem, więc nie wskazuje lepszego odbioru.
+    Używana z wątku SDR i wątku skanera, dlatego z blokadą.
+    """
+
+    FIELDS = ("gain", "dbm", "settle")
+
+    def __init__(self, filename="tuner_cache.json", max_entries=256):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(freq):
+        return int(round(freq / 10e3)) * 10000 # Siatka 10 kHz
+
+    def get(self, freq):
+        with self.lock:
+            entry = self.entries.get(self.key(freq))
+            return dict(entry) if entry else None
+
+    def update(self, freq, **values):
+        """Aktualizuje wpis i przesuwa go na koniec kolejki LRU."""
+        k = self.key(freq)
+        with self.lock:
+            entry = self.entries.pop(k, None) or dict.fromkeys(self.FIELDS)
+            entry.update(values)
+            entry["seen"] = time.time()
+            self.entries[k] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def record_settle(self, freq, seconds):
+        """Średnia wykładnicza czasu ustalenia sygnału po przestrojeniu."""
+        entry = self.get(freq)
+        old = entry["settle"] if entry and entry["settle"] is not None else seconds
+        self.update(freq, settle=0.7 * old + 0.3 * seconds)
+
+    def settle_time(self, freq, default):
+        entry = self.get(freq)
+        if entry and entry["settle"] is not None:
+            return entry["settle"]
+        return default
+
+    def active_channels(self, threshold_dbm, f_min, f_max):
+        """Częstotliwości, na których ostatnio zmierzono sygnał powyżej progu (rosnąco)."""
+        with self.lock:
+            return sorted(
+                k for k, e in self.entries.items()
+                if e["dbm"] is not None and e["dbm"] > threshold_dbm and f_min <= k <= f_max
+            )
+
+    def load(self):
+        if not os.path.exists(self.filename):
+            return
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            entries = []
+            for k, v in data.items():
+                if not isinstance(v, dict):
+                    continue # Pomijamy uszkodzone wpisy
+                # Brakujące pola (np. plik ze starszej wersji) uzupełniamy wartością None
+                entry = dict.fromkeys(self.FIELDS)
+                entry.update(v)
+                entry.setdefault("seen", 0)
+                entries.append((self.key(int(k)), entry))
+            with self.lock:
+                self.entries = OrderedDict(sorted(entries, key=lambda kv: kv[1]["seen"]))
+            print(f"Wczytano {len(self.entries)} wpisów pamięci tunera z {self.filename}")
+        except (json.JSONDecodeError, ValueError, AttributeError, TypeError):
+            print(f"BŁĄD: Plik {self.filename} jest uszkodzony. Start z pustą pamięcią tunera.")
+
+    def save(self):
+        try:
+            with self.lock:
+                data = {str(k): v for k, v in self.entries.items()}
+            with open(self.filename, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1)
+        except IOError as e:
+            print(f"BŁĄD zapisu do pliku {self.filename}: {e}")
+
+# Niezmienna migawka stanu publikowana przez wątek DSP
+# (since_tune: czas od przestrojenia do początku bloku, z którego pochodzi dbm)
+RadioStatus = namedtuple("RadioStatus", "seq running freq dbm gain timestamp since_tune")
+
+
+class StatusBus:
+    """
+    Jedyny pisarz (wątek DSP) publikuje niezmienne migawki RadioStatus.
+    Czytelnicy (skaner, GUI) biorą ostatnią migawkę albo czekają na spełnienie warunku.
+    """
+
+    def __init__(self, freq=100.0e6, gain='auto'):
+        self.cond = threading.Condition()
+        self.snapshot = RadioStatus(0, False, freq, -120.0, gain, 0.0, 0.0)
+
+    def latest(self):
+        return self.snapshot
+
+    def publish(self, **changes):
+        with self.cond:
+            self.snapshot = self.snapshot._replace(seq=self.snapshot.seq + 1, timestamp=time.time(), **changes)
+            self.cond.notify_all()
+            return self.snapshot
+
+    def wait(self, predicate, timeout):
+        """Czeka, aż migawka spełni predicate (albo minie timeout). Zwraca ostatnią migawkę."""
+        with self.cond:
+            self.cond.wait_for(lambda: predicate(self.snapshot), timeout)
+            return self.snapshot
+
+    def wake(self):
+        """Budzi czekających, by ponownie sprawdzili warunek (np. przy zatrzymaniu)."""
+        with self.cond:
+            self.cond.notify_all()
+
+
+class RadioEngine:
+    """
+    Pętla DSP i skaner. Jedynym pisarzem stanu tunera jest wątek process_sdr:
+    zmiany przychodzą jako komendy (send_command), stan wraca jako migawki w status_bus,
+    a zdarzenia dla GUI trafiają do ui_events.
+    """
+
+    def __init__(self, tuner_cache=None, audio_rate=48000, freq=100.0e6, gain='auto'):
+        self.sdr = None
+        self.demod = None
+        self.audio_rate = audio_rate
+        self.stream_server = None # Opcjonalny audio_server.AudioStreamServer
+
+        self.audio_queue = queue.Queue(maxsize=10)
+        self.commands = queue.Queue()
+        self.ui_events = queue.Queue()
+        self.notify = None # Wołane po każdym zdarzeniu dla GUI (budzi pętlę Tk)
+        self.status_bus = StatusBus(freq, gain)
+        self.tuner_cache = tuner_cache if tuner_cache is not None else TunerCache()
+
+        self.dsp_thread = None
+        self.scan_thread = None
+        self.scan_stop = threading.Event()
+
+    # === KOMUNIKACJA MIĘDZY WĄTKAMI ===
+
+    def send_command(self, name, value=None):
+        """Jedyny kanał zmian stanu tunera: komendy wykonuje process_sdr między blokami."""
+        self.commands.put((name, value))
+
+    def post_ui(self, handler, *args):
+        """Zdarzenie dla GUI: nazwa metody okna i jej argumenty (wykonywane w wątku GUI)."""
+        self.ui_events.put((handler, args))
+        if self.notify:
+            self.notify()
+
+    # === START / STOP ===
+
+    def start(self, sdr, demod, freq, gain, volume, recording=False):
+        """Uruchamia wątek DSP na otwartym źródle IQ z przygotowanym demodulatorem."""
+        self.sdr = sdr
+        self.demod = demod
+
+        # Stan początkowy przekazany wątkowi DSP - stare komendy i próbki są nieaktualne
+        for q in (self.audio_queue, self.commands, self.ui_events):
+            while not q.empty():
+                q.get_nowait()
+
+        self.dsp_thread = threading.Thread(
+            target=self.process_sdr, args=(freq, gain, volume, recording), daemon=True
+        )
+        self.dsp_thread.start()
+
+    def stop(self):
+        """
+        Deterministyczne zatrzymanie: skaner, komenda stop, dołączenie wątku DSP, dopiero potem zamknięcie SDR.
+        Jeśli wątek DSP czeka na dane, źródło z metodą interrupt() (rtl_tcp) jest przerywane
+        i wątek dołączany bez limitu czasu. Zwraca False, gdy wątek nie zakończył się
+        (źródło zostaje wtedy otwarte - zamknięcie klucza USB w trakcie odczytu jest niebezpieczne).
+        """
+        self.stop_scan()
+        if self.dsp_thread:
+            self.send_command("stop")
+            self.dsp_thread.join(timeout=0.5) # Zwykle kończy się po bieżącym bloku
+            if self.dsp_thread.is_alive():
+                interrupt = getattr(self.sdr, "interrupt", None)
+                if interrupt:
+                    interrupt()
+                    self.dsp_thread.join()
+                else:
+                    self.dsp_thread.join(timeout=2.0)
+            if self.dsp_thread.is_alive():
+                print("BŁĄD: wątek SDR nie zakończył się - źródło IQ pozostaje otwarte.")
+                return False
+            self.dsp_thread = None
+
+        if self.sdr:
+            try:
+                self.sdr.close()
+            except Exception as e:
+                print(f"Error closing SDR: {e}")
+            self.sdr = None
+        return True
+
+    def start_scan(self, f_min, f_max, f_step, threshold_dbm, pause_duration=5.0):
+        self.scan_stop.clear()
+        self.scan_thread = threading.Thread(
+            target=self.scan_worker,
+            args=(f_min, f_max, f_step, threshold_dbm, pause_duration),
+            daemon=True
+        )
+        self.scan_thread.start()
+
+    def stop_scan(self):
+        self.scan_stop.set()
+        self.status_bus.wake()
+        if self.scan_thread:
+            self.scan_thread.join() # Skaner czeka tylko na scan_stop i status_bus - budzi się od razu
+        self.scan_thread = None
+
+    # === SKANER ===
+
+    def scan_worker(self, f_min, f_max, f_step, threshold_dbm, pause_duration=5.0):
+        """Wątek roboczy do skanowania stacji (logika peak-finding na migawkach StatusBus)."""
+        freq = self.status_bus.latest().freq
+        if not (f_min <= freq <= f_max):
+             freq = f_min 
+        
+        squelch_threshold_dbm = threshold_dbm - 5.0 
+        paused = False
+        pause_time = 0
+
+        last_dbm = -120.0
+        is_climbing = False 
+        
+        # Najpierw sprawdź kanały, na których ostatnio był sygnał (pamięć tunera)
+        known_channels = [f for f in self.tuner_cache.active_channels(threshold_dbm, f_min, f_max) if f != freq]
+        if known_channels:
+            self.post_ui("log_info", f"Scan: Sprawdzam {len(known_channels)} znanych kanałów...")
+
+        while not self.scan_stop.is_set():
+            try:
+                if paused:
+                    # === FAZA PAUZY ===
+                    self.scan_stop.wait(0.2)
+                    status = self.status_bus.latest()
+                    time_elapsed = time.time() - pause_time
+                    
+                    if status.dbm < squelch_threshold_dbm or time_elapsed > pause_duration:
+                        paused = False
+                        last_dbm = -120.0 
+                        is_climbing = False 
+                        self.post_ui("log_info", f"Scan: Wznawiam skanowanie... (Sygnał: {status.dbm:.1f} dBm)")
+                        
+                elif known_channels:
+                    # === FAZA ZNANYCH KANAŁÓW ===
+                    known_freq = known_channels.pop(0)
+                    status = self.scan_measure(known_freq)
+                    
+                    if status.freq == known_freq and status.dbm > threshold_dbm:
+                        self.post_ui("on_scan_hit", known_freq, status.dbm, True)
+                        paused = True
+                        pause_time = time.time()
+                        
+                else:
+                    # === FAZA SKANOWANIA ===
+                    freq += f_step
+                    if freq > f_max:
+                        freq = f_min 
+                    
+                    status = self.scan_measure(freq)
+                    if self.scan_stop.is_set():
+                        break
+                    current_dbm_val = status.dbm
+                    
+                    if current_dbm_val > last_dbm:
+                        if current_dbm_val > threshold_dbm:
+                            is_climbing = True
+                    
+                    if current_dbm_val < last_dbm:
+                        if is_climbing:
+                            peak_freq = freq - f_step
+                            self.post_ui("on_scan_hit", peak_freq, last_dbm, False)
+                            paused = True
+                            pause_time = time.time()
+                            self.scan_tune(peak_freq)
+                            is_climbing = False 
+                    
+                    last_dbm = current_dbm_val
+            
+            except Exception as e:
+                print(f"Błąd w pętli skanera: {e}")
+                self.scan_stop.wait(0.1)
+
+    def scan_tune(self, freq):
+        """Przestrajanie z wątku skanera: komenda dla DSP i aktualizacja etykiety w GUI."""
+        self.send_command("tune", freq)
+        self.post_ui("set_frequency_from_thread", freq)
+
+    def scan_measure(self, freq, settle_default=0.03):
+        """
+        Przestraja i czeka na pierwszy blok z nowej częstotliwości rozpoczęty po czasie ustalenia
+        (z tolerancją pół bloku - przy wyuczonym czasie bliskim zera wystarcza pierwszy blok).
+        """
+        block_time = self.demod.block_size / self.demod.sample_rate
+        ready = self.tuner_cache.settle_time(freq, settle_default) - 0.5 * block_time
+        request_time = time.time()
+        self.scan_tune(freq)
+        return self.status_bus.wait(
+            lambda status: self.scan_stop.is_set() or (
+                status.freq == freq and status.timestamp > request_time and status.since_tune >= ready
+            ),
+            timeout=1.0
+        )
+
+    # === GŁÓWNA PĘTLA PRZETWARZANIA ===
+
+    def process_sdr(self, freq, gain, volume, recording):
+        """
+        Kluczowa pętla przetwarzania - jedyny pisarz stanu tunera.
+        Zmiany przychodzą jako komendy i są wykonywane między blokami (nigdy w trakcie bloku),
+        stan wraca jako niezmienne migawki w self.status_bus.
+        """
+        tuned_freq = freq
+        record_buffer = [] if recording else None
+        dbm = -120.0
+        tune_time = time.time()
+        settling = False
+        reference_dbm = None
+        reference_since = None
+        last_spectrum_update = 0
+        last_status_update = 0
+        running = True
+        
+        while running:
+            try:
+                # 1. Komendy z GUI i skanera
+                while True:
+                    try:
+                        name, value = self.commands.get_nowait()
+                    except queue.Empty:
+                        break
+                    if name == "stop":
+                        running = False
+                    elif name == "tune":
+                        freq = value
+                    elif name == "gain":
+                        gain = value
+                        self.set_sdr_gain(gain)
+                    elif name == "volume":
+                        volume = value
+                    elif name == "record":
+                        if value:
+                            record_buffer = []
+                        elif record_buffer is not None:
+                            self.post_ui("save_recording", record_buffer)
+                            record_buffer = None
+                if not running:
+                    break
+                
+                # 2. Ustaw częstotliwość w tym wątku (z wzmocnieniem z pamięci tunera)
+                if tuned_freq != freq:
+                    self.remember_tuner_state(tuned_freq, dbm, gain)
+                    try:
+                        self.sdr.center_freq = freq - self.demod.tuning_offset
+                        gain = self.apply_cached_gain(freq, gain)
+                    except Exception as e:
+                        print(f"Błąd ustawiania freq: {e}")
+                    self.demod.reset() # Historia filtrów należy do poprzedniej stacji
+                    if self.stream_server:
+                        self.stream_server.reset() # ...także decymatora strumienia IQ
+                    tuned_freq = freq
+                    tune_time = time.time()
+                    settling = True
+                    cached = self.tuner_cache.get(freq)
+                    reference_dbm = cached["dbm"] if cached else None # Ostatnio zmierzona moc kanału
+                    reference_since = None
+                                
+                # 3. Odczytaj próbki prosto do bufora complex64 (bez complex128)
+                block_start = time.time()
+                samples = self.demod.read_block(self.sdr)
+                
+                # 4. Moc (kluczowa dla skanera) i demodulacja audio
+                audio = self.fm_demodulate(volume)
+                dbm = self.demod.last_dbm
+                if record_buffer is not None:
+                    record_buffer.append(audio)
+                
+                # Czas ustalenia: początek pierwszego bloku, którego moc różni się o < 1 dB od ostatnio
+                # znanej (z pamięci tunera, a przy pierwszej wizycie lub zmianie sygnału - od poprzedniego
+                # bloku; wtedy ustalony był już blok poprzedni)
+                since_tune = block_start - tune_time
+                if settling:
+                    if reference_dbm is not None and abs(dbm - reference_dbm) < 1.0:
+                        settled = since_tune if reference_since is None else reference_since
+                        self.tuner_cache.record_settle(tuned_freq, min(settled, 0.5))
+                        settling = False
+                    reference_dbm = dbm
+                    reference_since = since_tune
+                
+                # 5. Opublikuj migawkę stanu; GUI dostaje ją co 200 ms, spektrum co 100 ms
+                status = self.status_bus.publish(
+                    running=True, freq=tuned_freq, dbm=dbm, gain=gain, since_tune=since_tune
+                )
+                now = time.time()
+                if now - last_status_update > 0.2:
+                    self.post_ui("on_status", status)
+                    last_status_update = now
+                if now - last_spectrum_update > 0.1:
+                    # Kopia, bo bufor IQ jest nadpisywany
+                    self.post_ui("update_spectrum", samples.copy(), tuned_freq)
+                    last_spectrum_update = now
+                
+                # 6. Wrzuć do kolejki
+                if self.stream_server:
+                    self.stream_server.publish_audio(audio)
+                    self.stream_server.publish_iq(samples)
+                
+                self.audio_queue.put(audio, timeout=0.5)
+
+            except queue.Full:
+                pass 
+            except Exception as e:
+                print(f"Błąd pętli SDR: {e}")
+                break 
+        
+        if record_buffer:
+            self.post_ui("save_recording", record_buffer)
+        self.remember_tuner_state(tuned_freq, dbm, gain)
+        self.status_bus.publish(running=False)
+
+    def remember_tuner_state(self, freq, dbm, gain):
+        """Zapisuje w pamięci tunera moc i ostatnie ręczne wzmocnienie opuszczanej częstotliwości."""
+        if freq is None:
+            return
+        values = {"dbm": round(float(dbm), 1)}
+        if gain != 'auto':
+            values["gain"] = float(gain)
+        self.tuner_cache.update(freq, **values)
+
+    def apply_cached_gain(self, freq, gain):
+        """Przy ręcznym wzmocnieniu od razu ustawia wartość zapamiętaną dla tej częstotliwości."""
+        if gain == 'auto':
+            return gain
+        entry = self.tuner_cache.get(freq)
+        if not entry or entry["gain"] is None or entry["gain"] == gain:
+            return gain
+        self.set_sdr_gain(entry["gain"])
+        self.post_ui("update_gain_display", entry["gain"])
+        return entry["gain"]
+
+    def set_sdr_gain(self, gain):
+        try:
+            self.sdr.gain = gain
+        except Exception as e:
+            print(f"Błąd ustawiania wzmocnienia: {e}")
+
+    # === DEMODULACJA ===
+    
+    def fm_demodulate(self, volume):
+        """Demodulacja Wide-Band FM bieżącego bloku (bufory robocze w self.demod)."""
+        try:
+            return self.demod.demodulate(volume)
+        except Exception as e:
+            print(f"Błąd demodulacji FM: {e}")
+            return np.zeros(int(self.audio_rate / 20), dtype=np.float32) # Zwróć ciszę
+
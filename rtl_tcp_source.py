@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Źródło IQ przez protokół rtl_tcp (zdalny tuner RTL-SDR).
+
+RtlTcpSource udaje interfejs RtlSdr używany przez radio.py
+(sample_rate, center_freq, gain, read_samples, close), więc przechwytywanie
+może działać na małym węźle przy antenie, a DSP i GUI na innym komputerze.
+
+Odbiór odbywa się do stałego bufora (recv_into), a konwersja uint8 -> complex64
+to jedna operacja np.take na tablicy LUT i reinterpretacja pamięci (view),
+bez pośrednich tablic. Po zerwaniu połączenia źródło łączy się ponownie
+i przywraca ustawienia tunera.
+
+Uruchomienie jako skrypt udostępnia nagranie .u8 (format rtl_sdr) jako serwer
+rtl_tcp - przydatne do testów bez klucza:
+    python3 rtl_tcp_source.py --serve-file nagranie.u8 --port 1234
+"""
+
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from fm_dsp import IQ_LUT
+
+# Komendy protokołu rtl_tcp (1 bajt komendy + 4 bajty parametru, big-endian)
+CMD_SET_FREQ = 0x01
+CMD_SET_SAMPLE_RATE = 0x02
+CMD_SET_GAIN_MODE = 0x03
+CMD_SET_GAIN = 0x04
+CMD_SET_AGC_MODE = 0x08
+
+DONGLE_INFO = struct.Struct(">4sII")
+COMMAND = struct.Struct(">BI")
+
+
+def parse_address(address, default_port=1234):
+    """'host:port' lub 'host' -> (host, port)."""
+    host, _, port = address.rpartition(":")
+    if not host:
+        return address, default_port
+    return host, int(port)
+
+
+class RtlTcpSource:
+    """Klient rtl_tcp z interfejsem zgodnym z RtlSdr."""
+
+    def __init__(self, host="127.0.0.1", port=1234, timeout=5.0, max_retries=5):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self.sock = None
+        self.tuner_type = None
+        self.gain_count = 0
+        self.closed = False
+        self.closing = threading.Event() # Przerywa odstępy między próbami połączenia
+        self.reconnects = 0
+        self.lock = threading.Lock()
+
+        self._sample_rate = None
+        self._center_freq = None
+        self._gain = 'auto'
+
+        # Bufor odbiorczy powiększany tylko przy większym żądaniu
+        self.raw = np.empty(0, dtype=np.uint8)
+
+        self.connect()
+
+    # === POŁĄCZENIE ===
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        header = self._recv_exact(sock, DONGLE_INFO.size)
+        magic, self.tuner_type, self.gain_count = DONGLE_INFO.unpack(header)
+        if magic != b"RTL0":
+            sock.close()
+            raise ConnectionError(f"Serwer {self.host}:{self.port} nie jest serwerem rtl_tcp")
+        self.sock = sock
+        self._apply_settings()
+
+    def _reconnect(self):
+        """Ponawia połączenie z rosnącym odstępem. Zgłasza ConnectionError po max_retries."""
+        self._drop_socket()
+        delay = 0.5
+        for attempt in range(1, self.max_retries + 1):
+            if self.closed:
+                break
+            try:
+                self.connect()
+                self.reconnects += 1
+                print(f"rtl_tcp: połączono ponownie z {self.host}:{self.port} (próba {attempt})")
+                return
+            except OSError as e:
+                print(f"rtl_tcp: próba {attempt} nieudana: {e}")
+                if self.closing.wait(delay):
+                    break
+                delay = min(delay * 2, 5.0)
+        raise ConnectionError(f"Utracono połączenie z rtl_tcp {self.host}:{self.port}")
+
+    def _apply_settings(self):
+        """Przywraca ustawienia tunera po (ponownym) połączeniu."""
+        if self._sample_rate is not None:
+            self._send(CMD_SET_SAMPLE_RATE, int(self._sample_rate))
+        if self._center_freq is not None:
+            self._send(CMD_SET_FREQ, int(self._center_freq))
+        self._send_gain()
+
+    def _drop_socket(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+
+    def close(self):
+        self.closed = True
+        self.closing.set()
+        if self.sock:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._drop_socket()
+
+    def interrupt(self):
+        """Przerywa odczyt lub ponowne łączenie z innego wątku (read_bytes zgłosi ConnectionError)."""
+        self.close()
+
+    # === USTAWIENIA (interfejs RtlSdr) ===
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, rate):
+        self._sample_rate = rate
+        self._send(CMD_SET_SAMPLE_RATE, int(rate))
+
+    @property
+    def center_freq(self):
+        return self._center_freq
+
+    @center_freq.setter
+    def center_freq(self, freq):
+        self._center_freq = freq
+        self._send(CMD_SET_FREQ, int(freq))
+
+    @property
+    def gain(self):
+        return self._gain
+
+    @gain.setter
+    def gain(self, gain):
+        self._gain = gain
+        self._send_gain()
+
+    def _send_gain(self):
+        if self._gain == 'auto':
+            self._send(CMD_SET_GAIN_MODE, 0)
+            self._send(CMD_SET_AGC_MODE, 1)
+        else:
+            self._send(CMD_SET_GAIN_MODE, 1)
+            self._send(CMD_SET_AGC_MODE, 0)
+            self._send(CMD_SET_GAIN, int(round(float(self._gain) * 10)))
+
+    def _send(self, cmd, param):
+        if self.sock is None:
+            return # Ustawienie zostanie wysłane po ponownym połączeniu
+        try:
+            with self.lock:
+                self.sock.sendall(COMMAND.pack(cmd, param & 0xFFFFFFFF))
+        except OSError as e:
+            print(f"rtl_tcp: błąd wysyłania komendy {cmd:#x}: {e}")
+
+    # === ODCZYT PRÓBEK ===
+
+    @staticmethod
+    def _recv_exact(sock, size):
+        data = bytearray(size)
+        view = memoryview(data)
+        pos = 0
+        while pos < size:
+            n = sock.recv_into(view[pos:], size - pos)
+            if n == 0:
+                raise ConnectionError("Serwer zamknął połączenie")
+            pos += n
+        return bytes(data)
+
+    def _fill(self, view):
+        # Lokalna referencja: close()/interrupt() z innego wątku zeruje self.sock
+        sock = self.sock
+        if sock is None:
+            raise ConnectionError("Brak połączenia z rtl_tcp")
+        pos = 0
+        size = len(view)
+        while pos < size:
+            n = sock.recv_into(view[pos:], size - pos)
+            if n == 0:
+                raise ConnectionError("Serwer zamknął połączenie")
+            pos += n
+
+    def read_bytes(self, num_bytes):
+        """Wypełnia wewnętrzny bufor surowymi bajtami IQ i zwraca go (widok, bez kopii)."""
+        if len(self.raw) < num_bytes:
+            self.raw = np.empty(num_bytes, dtype=np.uint8)
+        raw = self.raw[:num_bytes]
+        view = memoryview(raw)
+        while True:
+            if self.closed:
+                raise ConnectionError("Źródło rtl_tcp zamknięte")
+            try:
+                if self.sock is None:
+                    self._reconnect()
+                self._fill(view)
+                return raw
+            except (OSError, ConnectionError) as e:
+                if self.closed:
+                    raise ConnectionError("Źródło rtl_tcp zamknięte")
+                print(f"rtl_tcp: przerwany odbiór ({e}), łączenie ponownie...")
+                self._reconnect()
+
+    def read_samples(self, num_samples=8 * 1024, out=None):
+        """
+        Odczytuje num_samples próbek jako complex64.
+        Jeśli podano out (float32 o długości 2*num_samples lub complex64), wynik trafia do niego.
+        """
+        raw = self.read_bytes(2 * num_samples)
+        if out is None:
+            out = np.empty(2 * num_samples, dtype=np.float32)
+        elif out.dtype == np.complex64:
+            out = out.view(np.float32)
+        np.take(IQ_LUT, raw, out=out)
+        return out.view(np.complex64)
+
+
+# === ZASTĘPCZY SERWER rtl_tcp (TESTY) ===
+
+def serve_file(path, host="127.0.0.1", port=1234, sample_rate=288e3, loop=True, stop_event=None,
+               server_socket=None):
+    """
+    Udostępnia plik surowych próbek uint8 jako serwer rtl_tcp.
+    Komendy klienta są odczytywane i ignorowane, tempo wysyłania odpowiada sample_rate.
+    Obsługuje jednego klienta naraz; zwraca po ustawieniu stop_event.
+    Przy loop=False połączenie jest zamykane po końcu pliku (klient łączy się ponownie).
+    server_socket: gotowe gniazdo nasłuchujące (np. z portem 0 w testach) zamiast host/port.
+    """
+    data = np.fromfile(path, dtype=np.uint8)
+    chunk = 16 * 1024
+    chunk_time = chunk / 2 / sample_rate
+
+    srv = server_socket or socket.create_server((host, port))
+    srv.settimeout(0.5)
+    print(f"Zastępczy rtl_tcp: {path} na {host}:{srv.getsockname()[1]}")
+    try:
+        while stop_event is None or not stop_event.is_set():
+            try:
+                conn, peer = srv.accept()
+            except socket.timeout:
+                continue
+            conn.setblocking(True)
+            conn.sendall(DONGLE_INFO.pack(b"RTL0", 6, 29))
+            threading.Thread(target=_drain_commands, args=(conn,), daemon=True).start()
+            pos = 0
+            next_time = time.monotonic()
+            try:
+                while stop_event is None or not stop_event.is_set():
+                    if pos >= len(data):
+                        if not loop:
+                            break
+                        pos = 0
+                    conn.sendall(data[pos:pos + chunk].tobytes())
+                    pos += chunk
+                    next_time += chunk_time
+                    delay = next_time - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+            except OSError:
+                pass
+            finally:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                conn.close()
+    finally:
+        srv.close()
+
+
+def _drain_commands(conn):
+    try:
+        while conn.recv(COMMAND.size * 64):
+            pass
+    except OSError:
+        pass
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Zastępczy serwer rtl_tcp odtwarzający nagranie")
+    parser.add_argument("--serve-file", required=True, help="Plik surowych próbek uint8 (jak z rtl_sdr)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--rate", type=float, default=288e3)
+    args = parser.parse_args()
+    serve_file(args.serve_file, args.host, args.port, args.rate)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+"""
+Wspólna konfiguracja testów: moduły z katalogu głównego repozytorium
+i zapas budżetu czasu (--budget-slack albo FM_BUDGET_SLACK).
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--budget-slack", type=float, default=float(os.environ.get("FM_BUDGET_SLACK", "0.5")),
+        help="Dozwolony ułamek czasu trwania bloku dla p99 przetwarzania (domyślnie 0.5)"
+    )
+
+
+@pytest.fixture
+def budget_slack(request):
+    return request.config.getoption("--budget-slack")
+
+
+@pytest.fixture(params=["numpy", "numba"])
+def backend(request):
+    """Każde dostępne zaplecze DSP (Numba jest opcjonalna)."""
+    if request.param == "numba":
+        pytest.importorskip("numba")
+    return request.param
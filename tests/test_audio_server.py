@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""Serwer strumieniowy w pętli zwrotnej: audio PCM i ciągłość zdecymowanego IQ."""
+
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from audio_server import (AudioStreamServer, CODEC_IQ_C64, CODEC_PCM, KIND_AUDIO, KIND_IQ, FanOutBuffer,
+                          decode_pcm, receive_frames)
+
+
+@pytest.fixture
+def server():
+    server = AudioStreamServer(host="127.0.0.1", port=0, iq_rate=288e3, iq_decimation=4)
+    server.start()
+    yield server
+    server.stop()
+
+
+def receive(server, streams, frames, publish):
+    """Podłącza klienta, wywołuje publish() po subskrypcji i zwraca odebrane ramki."""
+    received = []
+    client = threading.Thread(target=lambda: received.extend(
+        asyncio.run(receive_frames("127.0.0.1", server.port, streams, frames, timeout=2.0))))
+    client.start()
+    deadline = time.monotonic() + 2.0
+    while server.client_count() == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.client_count() == 1
+    publish()
+    client.join(timeout=5.0)
+    return received
+
+
+def test_audio_loopback(server):
+    t = np.arange(960) / 48000
+    blocks = [(0.5 * np.sin(2 * np.pi * 1000 * (t + i * 0.02))).astype(np.float32) for i in range(5)]
+
+    frames = receive(server, "audio", len(blocks), lambda: [server.publish_audio(b) for b in blocks])
+
+    assert [f[0] for f in frames] == [KIND_AUDIO] * len(blocks)
+    assert [f[1] for f in frames] == [CODEC_PCM] * len(blocks)
+    assert [f[4] for f in frames] == list(range(len(blocks)))
+    assert frames[0][3] == 48000
+    audio = np.concatenate([decode_pcm(f[5]) for f in frames])
+    assert np.max(np.abs(audio - np.concatenate(blocks))) < 1e-4
+
+
+def test_iq_decimation_is_continuous_across_blocks(server):
+    block_size, blocks = 8 * 1024, 6
+    n = np.arange(block_size * blocks)
+    tone = (0.5 * np.exp(2j * np.pi * 10e3 / 288e3 * n)).astype(np.complex64)
+
+    frames = receive(server, "iq", blocks, lambda: [
+        server.publish_iq(tone[i * block_size:(i + 1) * block_size]) for i in range(blocks)
+    ])
+
+    assert len(frames) == blocks
+    assert all(f[0] == KIND_IQ and f[1] == CODEC_IQ_C64 and f[3] == 72000 for f in frames)
+    iq = np.concatenate([np.frombuffer(f[5], dtype="<c8") for f in frames])
+    assert len(iq) == len(tone) // 4
+
+    # Ton w paśmie przepustowym: po rozbiegu filtra stała amplituda, bez skoków na granicach bloków
+    magnitude = np.abs(iq[64:])
+    assert np.max(np.abs(magnitude - 0.5)) < 0.01
+
+
+def test_reset_drops_previous_station_from_iq_stream():
+    """Po reset() strumień IQ nowej stacji jest taki sam jak ze świeżego serwera."""
+    def collecting_server():
+        server = AudioStreamServer(iq_decimation=4)
+        server.fanout = FanOutBuffer(None)
+        server.fanout.wants = lambda kind: True
+        server.sent = []
+        server._publish = lambda kind, codec, rate, payload: server.sent.append(payload)
+        return server
+
+    rng = np.random.default_rng(0)
+    old_station, new_station = (
+        (rng.standard_normal(8 * 1024) + 1j * rng.standard_normal(8 * 1024)).astype(np.complex64)
+        for _ in range(2)
+    )
+    server, fresh = collecting_server(), collecting_server()
+    server.publish_iq(old_station)
+    server.reset()
+    server.publish_iq(new_station)
+    fresh.publish_iq(new_station)
+    assert server.sent[1] == fresh.sent[0]
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""Ankieta zajętości pasma: statystyki i zapis wyników dla różnych rozmiarów FFT."""
+
+import numpy as np
+import pytest
+
+from band_survey import BandSurvey
+
+
+@pytest.mark.parametrize("fft_size", [256, 512, 1000, 1024, 2048])
+def test_save_with_any_fft_size(tmp_path, fft_size):
+    survey = BandSurvey(fft_size=fft_size, waterfall_rows=4)
+    rng = np.random.default_rng(0)
+    for _ in range(2):
+        for step in range(survey.num_steps):
+            survey.add_step(step, rng.uniform(-100, -20, survey.bins_per_step))
+        survey.end_sweep()
+
+    prefix = str(tmp_path / "survey")
+    survey.save(prefix)
+
+    for suffix in (".csv", ".npz", "_histogram.png", "_waterfall.png"):
+        assert (tmp_path / f"survey{suffix}").stat().st_size > 0
+    assert np.all(survey.count == 2)
+
+
+def test_statistics_match_generated_levels():
+    survey = BandSurvey(f_min=88e6, f_max=90e6, fft_size=256, threshold_dbm=-60.0)
+    rng = np.random.default_rng(1)
+    sweeps = 200
+    levels = rng.uniform(-100, -20, (sweeps, survey.num_bins)).astype(np.float32)
+    levels[:, :10] = rng.normal(-70, 5, (sweeps, 10)) # Kilka binów z innym rozkładem
+    for sweep in levels:
+        for step in range(survey.num_steps):
+            survey.add_step(step, sweep[step * survey.bins_per_step:(step + 1) * survey.bins_per_step])
+        survey.end_sweep()
+
+    np.testing.assert_array_equal(survey.count, sweeps)
+    np.testing.assert_allclose(survey.min, levels.min(axis=0))
+    np.testing.assert_allclose(survey.max, levels.max(axis=0))
+    np.testing.assert_allclose(survey.mean(), levels.mean(axis=0, dtype=np.float64), atol=1e-4)
+    np.testing.assert_allclose(survey.duty_cycle(), (levels > -60.0).mean(axis=0))
+    for q in (10, 50, 90):
+        # Histogram zwraca środek przedziału (szerokość level_step) z q-tą próbką
+        expected = np.percentile(levels, q, axis=0, method="inverted_cdf")
+        np.testing.assert_allclose(survey.percentile(q), expected, atol=0.5 * survey.level_step)
+
+
+def test_unvisited_bins_are_nan():
+    survey = BandSurvey(f_min=88e6, f_max=90e6, fft_size=256)
+    survey.add_step(0, np.full(survey.bins_per_step, -50.0))
+    visited = slice(0, survey.bins_per_step)
+    unvisited = slice(survey.bins_per_step, None)
+
+    assert np.all(survey.percentile(50)[visited] == -49.5)
+    assert np.all(np.isnan(survey.percentile(50)[unvisited]))
+    assert np.all(np.isnan(survey.mean()[unvisited]))
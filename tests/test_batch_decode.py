@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""Dekodowanie wsadowe: częstotliwość WAV zgodna z torem DSP."""
+
+import numpy as np
+import pytest
+
+from batch_decode import decode_capture, decode_directory
+from fm_dsp import fm_test_bytes
+
+sf = pytest.importorskip("soundfile")
+
+BLOCK_SIZE = 8 * 1024
+
+
+@pytest.mark.parametrize("sample_rate", [240e3, 288e3])
+def test_wav_rate_matches_decoded_audio(tmp_path, sample_rate):
+    capture = tmp_path / "capture.u8"
+    capture.write_bytes(fm_test_bytes(4 * BLOCK_SIZE, sample_rate=sample_rate))
+
+    result = decode_capture(str(capture), str(tmp_path), sample_rate=sample_rate)
+
+    info = sf.info(str(tmp_path / "capture.wav"))
+    assert info.samplerate == 48000
+    assert info.duration == pytest.approx(result["seconds"], abs=1e-3)
+
+
+@pytest.mark.parametrize("sample_rate", [250e3, 1.024e6, 32e3])
+def test_rate_not_multiple_of_audio_rate_is_rejected(tmp_path, sample_rate):
+    capture = tmp_path / "capture.u8"
+    capture.write_bytes(np.full(2 * BLOCK_SIZE, 127, dtype=np.uint8).tobytes())
+
+    with pytest.raises(ValueError):
+        decode_capture(str(capture), str(tmp_path), sample_rate=sample_rate)
+    with pytest.raises(ValueError):
+        decode_directory(str(tmp_path), str(tmp_path / "out"), jobs=1, sample_rate=sample_rate)
+    assert not (tmp_path / "capture.wav").exists()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+"""Poprawność toru DSP na generowanych sygnałach FM i budżet czasu bloku."""
+
+import sys
+import time
+
+import numpy as np
+import pytest
+
+import fm_dsp
+from fm_dsp import FMDemodulator, fm_test_bytes
+
+SAMPLE_RATE = 288e3
+AUDIO_RATE = 48000
+BLOCK_SIZE = 8 * 1024
+WARMUP_BLOCKS = 3 # Stan filtrów i korektora IQ ustala się po kilku blokach
+
+
+def demodulate_tone(tone, deviation=75e3, blocks=24, noise=0.02, backend="auto"):
+    """Demoduluje wygenerowany sygnał FM z tonem. Zwraca audio bez bloków rozbiegowych."""
+    raw = fm_test_bytes(blocks * BLOCK_SIZE, tone=tone, deviation=deviation,
+                        sample_rate=SAMPLE_RATE, noise=noise)
+    demod = FMDemodulator(SAMPLE_RATE, AUDIO_RATE, BLOCK_SIZE, backend=backend)
+    step = 2 * BLOCK_SIZE
+    audio = []
+    for i in range(blocks):
+        demod.load_bytes(raw[i * step:(i + 1) * step])
+        audio.append(demod.demodulate())
+    return np.concatenate(audio[WARMUP_BLOCKS:])
+
+
+def tone_amplitude(audio, tone):
+    """Amplituda składowej o częstotliwości tone (projekcja na zespoloną sinusoidę)."""
+    t = np.arange(len(audio)) / AUDIO_RATE
+    return 2 * abs(np.mean(audio * np.exp(-2j * np.pi * tone * t)))
+
+
+def deemphasis_db(freqs, tau=75e-6):
+    """Charakterystyka cyfrowej de-emfazy y[n] = (1 - x) in[n] + x y[n-1] w dB."""
+    x = np.exp(-1 / (AUDIO_RATE * tau))
+    z = np.exp(-2j * np.pi * np.asarray(freqs) / AUDIO_RATE)
+    return 20 * np.log10(np.abs((1 - x) / (1 - x * z)))
+
+
+def test_tone_snr(backend):
+    audio = demodulate_tone(1000.0, backend=backend)
+    spectrum = np.abs(np.fft.rfft(audio * np.hanning(len(audio)))) ** 2
+    freqs = np.fft.rfftfreq(len(audio), 1 / AUDIO_RATE)
+    signal = spectrum[(freqs > 990) & (freqs < 1010)].sum()
+    noise = spectrum[(freqs > 100) & (freqs < 15000)].sum() - signal
+    assert 10 * np.log10(signal / noise) > 40.0
+
+
+def test_frequency_response_follows_deemphasis(backend):
+    tones = np.array([100.0, 300.0, 1000.0, 3000.0, 6000.0, 10000.0, 12000.0])
+    levels = np.array([
+        tone_amplitude(demodulate_tone(tone, deviation=15e3, noise=0.002, backend=backend), tone)
+        for tone in tones
+    ])
+    reference = levels[tones == 1000.0][0]
+    measured = 20 * np.log10(levels / reference)
+    expected = deemphasis_db(tones) - deemphasis_db(1000.0)
+    np.testing.assert_allclose(measured, expected, atol=1.0)
+
+
+def test_numba_matches_numpy():
+    pytest.importorskip("numba")
+    audio_diff, dbm_diff = fm_dsp.compare_backends()
+    assert audio_diff < 1e-4
+    assert dbm_diff < 1e-3
+
+
+def test_broken_numba_falls_back_to_numpy(monkeypatch, capsys):
+    """Numba zainstalowana, ale niedająca się zaimportować (np. niezgodny NumPy)."""
+    monkeypatch.setattr(fm_dsp, "HAVE_NUMBA", True)
+    monkeypatch.setattr(fm_dsp, "_kernels", None)
+    monkeypatch.setitem(sys.modules, "numba", None) # import numba -> ImportError
+    monkeypatch.delenv("FM_DSP_BACKEND", raising=False)
+
+    demod = FMDemodulator(SAMPLE_RATE, AUDIO_RATE, BLOCK_SIZE)
+    assert demod.backend == "numpy"
+    assert demod.kernels is None
+    assert not fm_dsp.HAVE_NUMBA
+    assert fm_dsp.resolve_backend("numba") == "numpy"
+    assert "Numba niedostępna" in capsys.readouterr().out
+
+    demod.load_bytes(fm_test_bytes(BLOCK_SIZE))
+    assert abs(len(demod.demodulate()) - BLOCK_SIZE / 6) < 1
+
+
+def test_block_time_budget(backend, budget_slack):
+    """p99 czasu bloku (load_bytes + demodulate) mieści się w budget_slack * czas bloku."""
+    raw = fm_test_bytes(BLOCK_SIZE)
+    demod = FMDemodulator(SAMPLE_RATE, AUDIO_RATE, BLOCK_SIZE, backend=backend)
+    for _ in range(WARMUP_BLOCKS):
+        demod.load_bytes(raw)
+        demod.demodulate()
+
+    times = np.empty(300)
+    for i in range(len(times)):
+        start = time.perf_counter()
+        demod.load_bytes(raw)
+        demod.demodulate()
+        times[i] = time.perf_counter() - start
+
+    p99 = np.percentile(times, 99)
+    limit = budget_slack * BLOCK_SIZE / SAMPLE_RATE
+    assert p99 <= limit, f"p99 {p99 * 1e3:.2f} ms > {limit * 1e3:.2f} ms"
+
+
+def test_reset_discards_previous_station(backend):
+    """Po reset() blok nowej stacji daje to samo audio co świeży demodulator."""
+    station_a = fm_test_bytes(4 * BLOCK_SIZE, tone=400.0, seed=1)
+    station_b = fm_test_bytes(BLOCK_SIZE, tone=3000.0, seed=2)
+
+    demod = FMDemodulator(SAMPLE_RATE, AUDIO_RATE, BLOCK_SIZE, backend=backend, correct_iq=False)
+    for i in range(4):
+        demod.load_bytes(station_a[2 * i * BLOCK_SIZE:2 * (i + 1) * BLOCK_SIZE])
+        demod.demodulate()
+    demod.reset()
+    demod.load_bytes(station_b)
+
+    fresh = FMDemodulator(SAMPLE_RATE, AUDIO_RATE, BLOCK_SIZE, backend=backend, correct_iq=False)
+    fresh.load_bytes(station_b)
+    np.testing.assert_allclose(demod.demodulate(), fresh.demodulate(), atol=1e-6)
+
+
+def test_carrier_at_dc_is_kept_without_tuning_offset():
+    """Bez offsetu nośna stacji leży na 0 Hz - korekcja DC nie może jej wyciąć."""
+    rng = np.random.default_rng(3)
+    carrier = 0.5 + 0.005 * (rng.standard_normal(BLOCK_SIZE) + 1j * rng.standard_normal(BLOCK_SIZE))
+    expected = fm_dsp.power_dbm(carrier.astype(np.complex64))
+
+    demod = FMDemodulator(SAMPLE_RATE, AUDIO_RATE, BLOCK_SIZE)
+    assert demod.corrector is None
+    for _ in range(20):
+        demod.process(carrier)
+    assert abs(demod.last_dbm - expected) < 0.1
+
+    # Z offsetem szpilka DC tunera jest poza kanałem i jest usuwana
+    shifted = FMDemodulator(SAMPLE_RATE, AUDIO_RATE, BLOCK_SIZE, tuning_offset=20e3)
+    for _ in range(20):
+        shifted.process(carrier)
+    assert shifted.last_dbm < expected - 20
+    dc, ratio, phase = shifted.corrector.imbalance()
+    assert abs(dc - 0.5) < 0.01
+
+
+@pytest.mark.parametrize("sample_rate", [250e3, 1.024e6, 32e3])
+def test_rate_not_multiple_of_audio_rate_is_rejected(sample_rate):
+    """Niecałkowita decymacja dałaby audio o innej częstotliwości niż audio_rate."""
+    with pytest.raises(ValueError):
+        FMDemodulator(sample_rate, AUDIO_RATE, BLOCK_SIZE)
+
+
+def test_iq_imbalance_is_estimated_and_image_rejected():
+    """Ton z niezrównoważeniem amplitudy (Q/I = 1.2) i fazy (0.1 rad): lustro znika po korekcji."""
+    gain, phase = 1.2, 0.1
+    tone = 30e3
+    corrector = fm_dsp.IQCorrector(BLOCK_SIZE, SAMPLE_RATE)
+    t = np.arange(BLOCK_SIZE) / SAMPLE_RATE
+
+    def component(iq, freq):
+        return abs(np.mean(iq * np.exp(-2j * np.pi * freq * t)))
+
+    for block in range(20):
+        w = 2 * np.pi * tone * (t + block * BLOCK_SIZE / SAMPLE_RATE)
+        iq = (0.5 * (np.cos(w) + 1j * gain * np.sin(w + phase))).astype(np.complex64)
+        if block == 0:
+            image_before = 20 * np.log10(component(iq, -tone) / component(iq, tone))
+        corrector.process(iq)
+
+    image_after = 20 * np.log10(component(iq, -tone) / component(iq, tone) + 1e-12)
+    assert image_before > -25
+    assert image_after < -60
+
+    dc, ratio, phase_deg = corrector.imbalance()
+    assert abs(dc) < 1e-3
+    assert ratio == pytest.approx(gain, abs=0.01)
+    assert phase_deg == pytest.approx(np.degrees(phase), abs=0.1)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""Pętla DSP i skaner (radio_engine) na udawanym tunerze z nośnymi FM o znanych częstotliwościach."""
+
+import json
+import queue
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from audio_server import AudioStreamServer
+from fm_dsp import FMDemodulator, fm_test_bytes
+from radio_engine import RadioEngine, TunerCache
+
+SAMPLE_RATE = 288e3
+
+
+class FakeTuner:
+    """Udawany RtlSdr: nośne FM o znanych częstotliwościach, moc maleje z odstrojeniem."""
+
+    def __init__(self, carriers, center_freq, amplitude=0.8, width=100e3, noise=0.005, read_delay=0.002):
+        self.carriers = carriers
+        self.amplitude = amplitude
+        self.width = width
+        self.noise = noise
+        self.read_delay = read_delay
+        self.center_freq = center_freq
+        self.gain = 'auto'
+        self.sample_rate = SAMPLE_RATE
+        self.closed = False
+
+    def read_bytes(self, num_bytes):
+        time.sleep(self.read_delay) # Tuner nie oddaje danych natychmiast
+        offset = min(abs(self.center_freq - f) for f in self.carriers)
+        amplitude = self.amplitude * np.exp(-(offset / self.width) ** 2)
+        return fm_test_bytes(num_bytes // 2, amplitude=amplitude, noise=self.noise,
+                             seed=int(self.center_freq / 1e3) % 1000)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """RadioEngine z pustą pamięcią tunera i wątkiem opróżniającym kolejkę audio."""
+    engine = RadioEngine(TunerCache(str(tmp_path / "tuner_cache.json")))
+    done = threading.Event()
+
+    def drain_audio():
+        while not done.is_set():
+            try:
+                engine.audio_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    threading.Thread(target=drain_audio, daemon=True).start()
+    yield engine
+    engine.stop()
+    done.set()
+
+
+def start(engine, carriers, freq, **options):
+    tuner = FakeTuner(carriers, freq, **options)
+    engine.start(tuner, FMDemodulator(SAMPLE_RATE), freq, 'auto', 1.0)
+    engine.status_bus.wait(lambda status: status.running, timeout=2.0)
+    return tuner
+
+
+def test_scanner_stops_on_known_carriers(engine):
+    carriers = (89.0e6, 95.3e6, 101.7e6)
+    f_min, f_max = 88.0e6, 103.0e6
+    start(engine, carriers, f_min)
+    engine.start_scan(f_min, f_max, 100e3, -40.0, pause_duration=0.2)
+
+    # Skaner startuje od f_min; przebieg kończy się po powrocie na początek pasma
+    hits = []
+    seen_top = False
+    deadline = time.time() + 60.0
+    while time.time() < deadline:
+        try:
+            handler, args = engine.ui_events.get(timeout=0.1)
+            if handler == "on_scan_hit":
+                hits.append(args[0])
+        except queue.Empty:
+            pass
+        freq = engine.status_bus.latest().freq
+        if freq >= f_max - 100e3:
+            seen_top = True
+        elif seen_top and freq < f_min + 500e3:
+            break
+    else:
+        pytest.fail(f"Przebieg skanera nie zakończył się, trafienia: {hits}")
+
+    engine.stop_scan()
+    assert sorted({round(f / 100e3) * 100e3 for f in hits}) == sorted(carriers)
+
+
+def test_stop_joins_threads_and_closes_tuner(engine):
+    tuner = start(engine, (95.0e6,), 95.0e6)
+    engine.start_scan(94.0e6, 96.0e6, 100e3, -40.0)
+    engine.stop()
+    assert engine.dsp_thread is None and engine.scan_thread is None
+    assert tuner.closed
+    assert engine.status_bus.latest().running is False
+
+
+def test_reacquisition_uses_learned_settle_time(engine):
+    """Po pierwszej wizycie kanał jest mierzony z pierwszego bloku zamiast po domyślnych 30 ms."""
+    block_time = 8 * 1024 / SAMPLE_RATE
+    start(engine, (95.0e6, 96.0e6), 95.0e6, read_delay=block_time) # Bloki w czasie rzeczywistym
+
+    first_visit = engine.scan_measure(96.0e6)
+    engine.scan_measure(95.0e6) # Opuszczenie kanału zapisuje jego moc w pamięci tunera
+    revisit = engine.scan_measure(96.0e6)
+
+    assert first_visit.freq == revisit.freq == 96.0e6
+    assert engine.tuner_cache.settle_time(96.0e6, 0.03) < 0.5 * block_time
+    assert first_visit.since_tune >= 0.5 * block_time # Domyślnie: drugi blok po przestrojeniu
+    assert revisit.since_tune < 0.5 * block_time # Z pamięci tunera: pierwszy blok
+
+
+def test_cache_load_fills_missing_fields(tmp_path):
+    """Wpisy bez gain/dbm/settle (np. ze starszej wersji) nie mogą przerwać pętli DSP."""
+    path = tmp_path / "tuner_cache.json"
+    path.write_text(json.dumps({"95000000": {"dbm": -50}, "96000000": "uszkodzony", "97000000": {}}))
+    cache = TunerCache(str(path))
+    cache.load()
+
+    assert cache.get(95.0e6) == {"gain": None, "dbm": -50, "settle": None, "seen": 0}
+    assert cache.get(96.0e6) is None
+    assert cache.settle_time(97.0e6, 0.03) == 0.03
+    cache.record_settle(95.0e6, 0.01)
+    assert cache.settle_time(95.0e6, 0.03) == pytest.approx(0.01)
+    assert cache.active_channels(-60.0, 88e6, 108e6) == [95000000]
+
+
+def test_stop_interrupts_stalled_rtl_tcp_source(engine):
+    """Serwer rtl_tcp, który przestał wysyłać dane, nie blokuje zatrzymania."""
+    from rtl_tcp_source import DONGLE_INFO, RtlTcpSource
+
+    server = socket.create_server(("127.0.0.1", 0))
+    connections = []
+
+    def accept():
+        conn, _ = server.accept()
+        conn.sendall(DONGLE_INFO.pack(b"RTL0", 6, 29)) # Nagłówek i cisza
+        connections.append(conn)
+
+    threading.Thread(target=accept, daemon=True).start()
+    source = RtlTcpSource("127.0.0.1", server.getsockname()[1])
+    engine.start(source, FMDemodulator(SAMPLE_RATE), 95.0e6, 'auto', 1.0)
+    time.sleep(0.2) # Wątek DSP czeka w read_bytes
+
+    start_time = time.perf_counter()
+    assert engine.stop()
+    assert time.perf_counter() - start_time < 2.0
+    assert source.closed and engine.dsp_thread is None
+
+    for conn in connections:
+        conn.close()
+    server.close()
+
+
+def test_retune_resets_demodulator_state(engine):
+    stream_resets = []
+    engine.stream_server = AudioStreamServer(port=0) # Niewystartowany: publish_* nic nie wysyła
+    engine.stream_server.reset = lambda: stream_resets.append(True)
+    start(engine, (95.0e6,), 95.0e6)
+    resets = []
+    reset = engine.demod.reset
+    engine.demod.reset = lambda: (resets.append(True), reset())
+    engine.send_command("tune", 96.0e6)
+    engine.status_bus.wait(lambda status: status.freq == 96.0e6, timeout=2.0)
+    assert resets
+    assert stream_resets
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""Źródło rtl_tcp na zastępczym serwerze odtwarzającym nagranie (serve_file)."""
+
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from rtl_tcp_source import DONGLE_INFO, RtlTcpSource, serve_file
+
+BLOCK_BYTES = 2 * 8 * 1024
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / "nagranie.u8"
+    data = np.random.default_rng(0).integers(0, 256, 4 * BLOCK_BYTES, dtype=np.uint8)
+    data.tofile(path)
+    return path, data
+
+
+@pytest.fixture
+def file_server(recording):
+    """serve_file na losowym porcie; po końcu pliku zrywa połączenie (loop=False)."""
+    path, data = recording
+    server = socket.create_server(("127.0.0.1", 0))
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=serve_file, args=(str(path),),
+        kwargs=dict(sample_rate=10e6, loop=False, stop_event=stop, server_socket=server), daemon=True
+    )
+    thread.start()
+    yield server.getsockname()[1], data
+    stop.set()
+    thread.join(timeout=2.0)
+
+
+def test_read_bytes_returns_file_and_survives_server_drop(file_server):
+    port, data = file_server
+    source = RtlTcpSource("127.0.0.1", port)
+    source.sample_rate = 288e3
+    source.center_freq = 95.0e6
+    try:
+        received = [source.read_bytes(BLOCK_BYTES).copy() for _ in range(len(data) // BLOCK_BYTES)]
+        np.testing.assert_array_equal(np.concatenate(received), data)
+        assert source.reconnects == 0
+
+        # Koniec pliku = serwer zamyka połączenie; źródło łączy się ponownie i czyta od początku
+        np.testing.assert_array_equal(source.read_bytes(BLOCK_BYTES), data[:BLOCK_BYTES])
+        assert source.reconnects == 1
+        assert source.center_freq == 95.0e6
+    finally:
+        source.close()
+
+
+def test_close_from_another_thread_ends_read():
+    """close() w trakcie odczytu kończy read_bytes błędem ConnectionError (nie AttributeError)."""
+    server = socket.create_server(("127.0.0.1", 0))
+    connections = []
+
+    def accept():
+        conn, _ = server.accept()
+        conn.sendall(DONGLE_INFO.pack(b"RTL0", 6, 29)) # Nagłówek i cisza
+        connections.append(conn)
+
+    threading.Thread(target=accept, daemon=True).start()
+    source = RtlTcpSource("127.0.0.1", server.getsockname()[1])
+    threading.Timer(0.2, source.close).start()
+    try:
+        with pytest.raises(ConnectionError):
+            source.read_bytes(BLOCK_BYTES)
+    finally:
+        for conn in connections:
+            conn.close()
+        server.close()